@@ -2,11 +2,22 @@ import streamlit as st
 from state import init_session_state
 
 from app_ui import display_search_box_and_cards
+from llm import config
+from metrics import start_prometheus_server
+
+@st.cache_resource
+def start_metrics_export():
+    """Starts the Prometheus endpoint once per process if a port is configured."""
+    port = config.get("metrics", {}).get("prometheus_port")
+    if port:
+        return start_prometheus_server(port)
+    return None
 
 def main():
     st.set_page_config(page_title="Problem helper", page_icon=":question:", layout="wide")
 
     init_session_state()
+    start_metrics_export()
 
     display_search_box_and_cards(st.container())
 
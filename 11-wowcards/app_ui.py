@@ -2,7 +2,9 @@ import streamlit as st
 # Updated imports for wizard flow
 # from state import ( # Removed empty import
 # )
-from card_query import generate_cards, expand_topic_details # Updated import
+from card_query import generate_cards, generate_cards_batch, expand_topic_details_stream, related_query # Updated import
+from llm import config
+from state import get_card_snapshot, save_card_snapshot
 
 def display_search_box_and_cards(container):
     """Displays the search box, cards, and navigation buttons."""
@@ -29,11 +31,15 @@ def display_search_box_and_cards(container):
                 st.rerun()
             
             if st.session_state.expanded_content is None and st.session_state.drawer_topic_content:
-                with st.spinner("Digging deeper..."):
-                    st.session_state.expanded_content = expand_topic_details(
-                        st.session_state.drawer_topic_title,
-                        st.session_state.drawer_topic_content
-                    )
+                # Stream the Markdown into a placeholder as it arrives instead of waiting behind a spinner
+                stream_placeholder = st.empty()
+                stream_placeholder.markdown("_Digging deeper..._")
+                st.session_state.expanded_content = expand_topic_details_stream(
+                    st.session_state.drawer_topic_title,
+                    st.session_state.drawer_topic_content,
+                    on_text=stream_placeholder.markdown
+                )
+                stream_placeholder.empty()
             
             if st.session_state.expanded_content:
                 st.markdown(st.session_state.expanded_content)
@@ -55,48 +61,41 @@ def display_search_box_and_cards(container):
     if 'cards' not in st.session_state: # Ensure cards list exists
         st.session_state.cards = []
 
+    def navigate_to_history_entry(index):
+        # Show the cards of a history entry, from its snapshot when it has one so Back/Forward are instant
+        query = st.session_state.query_history[index]
+        st.session_state.history_index = index
+        st.session_state.search_query = query
+        st.session_state.next_run_search_input_value = query # For text area display on next run
 
-    # --- Back Button ---
-    # Show back button if there's a history to go back to (more than just the current query if it's already added)
-    # or if there's at least one item if the current query isn't yet the last in history.
-    # Simplified: show if history has at least one item to potentially go back to.
-    # The actual logic inside handles if it's possible to go back.
-    if st.session_state.query_history: 
-        if container.button("Back", key="back_button"):
-            if len(st.session_state.query_history) > 1: # Need at least two items to go "back"
-                st.session_state.query_history.pop() # Remove current query from history
-                previous_query = st.session_state.query_history[-1] # Get the actual previous query
-                
-                st.session_state.search_query = previous_query
-                st.session_state.next_run_search_input_value = previous_query # For text area display on next run
-                
-                st.session_state.cards = [] # Clear current cards
-                with st.spinner("Fetching cards..."):
-                    card_list_data = generate_cards(st.session_state.search_query)
-                    if card_list_data and card_list_data.cards:
-                        st.session_state.cards = card_list_data.cards
-                    else:
-                        st.session_state.cards = []
-                st.rerun()
-            elif len(st.session_state.query_history) == 1 and st.session_state.get('search_query') != st.session_state.query_history[0]:
-                # This case handles if we are on a query not yet added to history's end, and want to go to history's only item.
-                # However, current history logic in update_history_and_search appends new queries.
-                # So, len > 1 is the primary condition.
-                # For robustness, if only one item in history, and current search is different, go to that one.
-                previous_query = st.session_state.query_history[0]
-                st.session_state.search_query = previous_query
-                st.session_state.next_run_search_input_value = previous_query
-                st.session_state.cards = []
-                with st.spinner("Fetching cards..."):
-                    card_list_data = generate_cards(st.session_state.search_query)
-                    if card_list_data and card_list_data.cards:
-                        st.session_state.cards = card_list_data.cards
-                    else:
-                        st.session_state.cards = []
-                st.rerun()
-            else:
-                # Cannot go back further or history is in an unexpected state
-                st.toast("No previous query to go back to.")
+        cards = get_card_snapshot(query)
+        if cards is None:
+            with st.spinner("Fetching cards..."):
+                card_list_data = generate_cards(query)
+            cards = card_list_data.cards if card_list_data and card_list_data.cards else []
+            if cards:
+                save_card_snapshot(query, cards)
+        st.session_state.cards = cards
+        st.rerun()
+
+    # --- Back / Forward / History ---
+    history = st.session_state.query_history
+    history_index = st.session_state.history_index
+    if history:
+        back_col, forward_col, history_col = container.columns([1, 1, 6])
+        if back_col.button("Back", key="back_button", disabled=history_index <= 0):
+            navigate_to_history_entry(history_index - 1)
+        if forward_col.button("Forward", key="forward_button", disabled=history_index >= len(history) - 1):
+            navigate_to_history_entry(history_index + 1)
+        selected_index = history_col.selectbox(
+            label="History",
+            label_visibility="collapsed",
+            options=range(len(history)),
+            index=history_index,
+            format_func=lambda i: f"{i + 1}. {history[i][:100]}",
+        )
+        if selected_index != history_index:
+            navigate_to_history_entry(selected_index)
 
 
     # Determine the value for the text_area.
@@ -118,31 +117,12 @@ def display_search_box_and_cards(container):
     )
     
     def update_history_and_search(new_query):
-        # Add current st.session_state.search_query to history if it's different from the last one 
-        # or if history is empty, and it's not an empty string.
-        # This is before st.session_state.search_query is updated to new_query.
-        current_active_query = st.session_state.get('search_query', "")
-        if current_active_query: # Only add non-empty queries
-            if not st.session_state.query_history or st.session_state.query_history[-1] != current_active_query:
-                st.session_state.query_history.append(current_active_query)
-
-        st.session_state.search_query = new_query # Update the active search query
-
-        # Add the new_query itself to history if it's different from the (now previous) last item.
-        # This makes new_query the latest in history.
-        if new_query: # Only add non-empty queries
-            if not st.session_state.query_history or st.session_state.query_history[-1] != new_query:
-                st.session_state.query_history.append(new_query)
-            # If new_query is same as last, query_history is already correct.
-
-        st.session_state.cards = [] # Clear previous cards
-        with st.spinner("Fetching cards..."):
-            card_list_data = generate_cards(st.session_state.search_query)
-            if card_list_data and card_list_data.cards:
-                st.session_state.cards = card_list_data.cards
-            else:
-                st.session_state.cards = []
-        st.rerun()
+        # Searching from the middle of the history drops the forward entries, like a browser does
+        history = st.session_state.query_history[:st.session_state.history_index + 1]
+        if not history or history[-1] != new_query:
+            history.append(new_query)
+        st.session_state.query_history = history
+        navigate_to_history_entry(len(history) - 1)
 
     if container.button("Search", key="search_button"):
         # Use the current value from the text_area (bound to st.session_state.search_input)
@@ -165,12 +145,12 @@ def display_search_box_and_cards(container):
                     st.markdown(f"### {card_data.title}")
                     st.markdown(card_data.content)
                     if st.button("Related", key=f"next_card_{i}"):
-                        new_search_query = f"{card_data.title}. {card_data.content}"
+                        new_search_query = related_query(card_data)
                         # Set search_query for the actual search
                         st.session_state.search_query = new_search_query
                         # Set for text_area display on the *next* run
                         st.session_state.next_run_search_input_value = new_search_query
-                        # update_history_and_search will use st.session_state.search_query, update history, fetch, rerun
+                        # update_history_and_search updates history, fetches (or reuses a snapshot) and reruns
                         update_history_and_search(new_search_query)
                     
                     if st.button("Dig deeper", key=f"dig_deeper_card_{i}"):
@@ -179,6 +159,15 @@ def display_search_box_and_cards(container):
                         st.session_state.expanded_content = None # Reset for new content
                         st.session_state.dig_deeper_active = True
                         st.rerun() # Rerun to show sidebar and trigger content loading
-        
+
+        # Pre-compute the "Related" results of all cards in a single request so clicking them hits the cache.
+        # Once per card set: topics the LLM left out would otherwise be requested again on every rerun.
+        # A set is only marked once the batch returned results, so an interrupted or failed batch is retried.
+        if config.get("prefetch_related"):
+            related_queries = tuple(related_query(card_data) for card_data in st.session_state.cards)
+            prefetched = st.session_state.setdefault('prefetched_card_sets', set())
+            if related_queries not in prefetched and generate_cards_batch(list(related_queries)):
+                prefetched.add(related_queries)
+
     elif st.session_state.get('search_query') and not st.session_state.get('cards'):
         pass # Handled by spinner/generate_cards 
\ No newline at end of file
@@ -0,0 +1,129 @@
+import sys
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Hashable, Optional
+from pydantic import BaseModel
+
+def estimate_size(value: Any) -> int:
+    """Approximate memory footprint of a cached value in bytes."""
+    if isinstance(value, BaseModel):
+        return len(value.model_dump_json())
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    return sys.getsizeof(value)
+
+class CacheManager:
+    """
+    Process-wide in-memory LRU tier in front of the persistent query cache.
+
+    Entries are shared by all sessions and returned as they are, without copying, so
+    cached values must be treated as immutable (the card schemas are frozen models).
+    Memory stays bounded by max_entries and max_bytes however many sessions are active,
+    and entries older than ttl_seconds are dropped.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict() # key -> (value, size, stored_at)
+        self._lock = threading.Lock()
+        self._flights = {} # key -> [lock, callers] of the calls filling a missing entry
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, count_miss: bool = True) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds is not None and time.monotonic() - entry[2] > self.ttl_seconds:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                if count_miss:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return # Would evict everything else
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic())
+            self.size_bytes += size
+            while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self.size_bytes -= size
+
+    @contextmanager
+    def _single_flight(self, key: Hashable):
+        """Serializes the callers filling the same key, so only the first one computes the value."""
+        with self._lock:
+            flight = self._flights.setdefault(key, [threading.Lock(), 0])
+            flight[1] += 1
+        try:
+            with flight[0]:
+                yield
+        finally:
+            with self._lock:
+                flight[1] -= 1
+                if flight[1] == 0:
+                    del self._flights[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    @staticmethod
+    def key(namespace: str, *args, **kwargs) -> Hashable:
+        """The memory tier key of a call to the function cached under namespace with these arguments."""
+        return (namespace, args, tuple(sorted(kwargs.items())))
+
+    def cached(self, namespace: str) -> Callable:
+        """
+        Decorator that serves calls from the memory tier and falls back to the wrapped
+        function (which reads the persistent cache or calls the LLM) on a miss.
+        None results are not cached, so failed calls are retried.
+        Concurrent misses on the same key wait for the first caller and are then served from memory.
+        """
+        def decorator(function: Callable) -> Callable:
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                key = self.key(namespace, *args, **kwargs)
+                value = self.get(key, count_miss=False)
+                if value is not None:
+                    return value
+                with self._single_flight(key):
+                    value = self.get(key)
+                    if value is None:
+                        value = function(*args, **kwargs)
+                        if value is not None:
+                            self.put(key, value)
+                return value
+            return wrapper
+        return decorator
@@ -1,7 +1,17 @@
 import streamlit as st
-from pydantic import BaseModel, Field, ValidationError
-from typing import List, Optional
-from llm import call_llm, ModelSpeed
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_serializer
+import json
+import time
+from types import MappingProxyType
+from typing import List, Dict, Tuple, Optional, Callable, Any
+from llm import call_llm, stream_llm, ModelSpeed, config, get_cache_key, get_cached_response, save_cached_response
+from semantic_cache import SemanticCache, create_semantic_cache
+from metrics import metrics, HIT
+from cache_manager import CacheManager
+
+# Shared by all sessions; results are returned without copying, so the schemas below are frozen
+# and hold tuples and read-only mappings instead of lists and dicts
+memory_cache = CacheManager(**config.get("memory_cache", {}))
 
 # --- Pydantic Schemas for Validation ---
 
@@ -13,15 +23,22 @@ class CardList(BaseModel):
     cards: List[Card] = Field(..., min_items=1, max_items=100)
 
 class CardData(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     title: str = Field(..., description="The title of the card")
     content: str = Field(..., description="The content of the card, 2-3 sentences")
     # query: str = Field(..., description="A query to run to get more information on this topic") # Assuming this was for related, not dig deeper
 
 class CardListData(BaseModel):
-    cards: List[CardData] = Field(..., description="A list of cards")
+    model_config = ConfigDict(frozen=True)
 
-PROMPT_GENERATE_CARDS = """
+    cards: Tuple[CardData, ...] = Field(..., description="A list of cards")
+
+# Prompts are split into static instructions, sent first as the system message, and the variable
+# part, sent last as the user message, so the provider can cache the shared instruction prefix
+SYSTEM_GENERATE_CARDS = """
 # Role: Idea Explorer Assistant
+You are an assistant that generates topical cards and outputs valid JSON.
 
 ## Goal:
 Generate a list of 3-5 distinct but related "cards" based on the user's topic. Each card should present a sub-topic, a related concept, or a question that encourages further exploration. The user is looking for a quick overview and pointers to branch out their understanding.
@@ -32,52 +49,189 @@ Each card must have:
 2.  **content**: A brief explanation or exploration of the title (2-3 sentences).
 
 ## Instructions:
-- Analyze the user's input topic: "{user_topic}".
+- Analyze the user's input topic, given in the user message.
 - Brainstorm 3-5 diverse yet relevant sub-topics or angles.
 - For each, craft a `title` and `content` as described above.
 - Ensure the cards offer a good spread of ideas stemming from the main topic.
 - Output a JSON object following this Pydantic schema:
   ```json
-  {{
+  {
     "cards": [
-      {{
+      {
         "title": "string",
         "content": "string"
-      }}
+      }
     ]
-  }}
+  }
   ```
 - Do not include any conversational fluff or explanations outside the JSON structure.
 """
 
-@st.cache_data(show_spinner=False) # This spinner is for the initial card generation
+PROMPT_GENERATE_CARDS = """The user's input topic: "{user_topic}"
+"""
+
+@st.cache_resource(show_spinner=False)
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """Returns the shared semantic cache, or None if it is disabled in config.json."""
+    semantic_config = config.get("semantic_cache", {})
+    if not semantic_config.get("enabled"):
+        return None
+    return create_semantic_cache(semantic_config)
+
+def related_query(card_data: CardData) -> str:
+    """The query behind a card's "Related" button."""
+    return f"{card_data.title}. {card_data.content}"
+
+@memory_cache.cached("generate_cards")
 def generate_cards(user_topic: str) -> Optional[CardListData]:
     """Generates a list of cards based on the user_topic."""
     if not user_topic:
         return None
     
     prompt = PROMPT_GENERATE_CARDS.format(user_topic=user_topic)
+
+    # Small variations of an earlier topic reuse its cards instead of calling the LLM. The semantic
+    # cache is only consulted when the exact disk lookup misses, so that lookup is done here once
+    semantic_cache = get_semantic_cache()
+    if semantic_cache:
+        start_time = time.perf_counter()
+        cached = get_cached_response(get_cache_key(prompt, SYSTEM_GENERATE_CARDS), CardListData)
+        if cached is not None:
+            metrics.record_call(ModelSpeed.MEDIUM.value, "disk", HIT, time.perf_counter() - start_time)
+            return cached
+        similar_key = semantic_cache.lookup(user_topic)
+        if similar_key:
+            cached = get_cached_response(similar_key, CardListData)
+            if cached is not None:
+                metrics.record_call(ModelSpeed.MEDIUM.value, "semantic", HIT, time.perf_counter() - start_time)
+                return cached
     
     response_data = call_llm(
         prompt=prompt,
         model_speed=ModelSpeed.MEDIUM, # Or another speed as preferred
         expected_schema=CardListData,
-        system_message="You are an assistant that generates topical cards and outputs valid JSON."
+        system_message=SYSTEM_GENERATE_CARDS,
+        cache=not semantic_cache
     )
+    if semantic_cache and response_data:
+        save_cached_response(prompt, SYSTEM_GENERATE_CARDS, CardListData, response_data)
+        semantic_cache.add(user_topic, get_cache_key(prompt, SYSTEM_GENERATE_CARDS))
     return response_data
 
+class CardBatchData(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    topics: Dict[str, CardListData] = Field(..., description="The cards for each topic, keyed by the topic text")
+
+    def model_post_init(self, __context: Any):
+        # Also runs for model_construct; frozen only stops reassigning topics, not changing the dict
+        object.__setattr__(self, "topics", MappingProxyType(self.topics))
+
+    @field_serializer("topics")
+    def _serialize_topics(self, topics):
+        return dict(topics)
+
+SYSTEM_GENERATE_CARDS_BATCH = """
+# Role: Idea Explorer Assistant
+You are an assistant that generates topical cards and outputs valid JSON.
+
+## Goal:
+For EACH of the user's topics, generate a list of 3-5 distinct but related "cards". Each card should present a sub-topic, a related concept, or a question that encourages further exploration. The user is looking for a quick overview and pointers to branch out their understanding.
+
+## Card Structure:
+Each card must have:
+1.  **title**: A concise and engaging title (3-7 words).
+2.  **content**: A brief explanation or exploration of the title (2-3 sentences).
+
+## Instructions:
+- The user message contains a JSON list of topics. Handle every topic in it independently.
+- For each topic, brainstorm 3-5 diverse yet relevant sub-topics or angles and craft a `title` and `content` for each.
+- Output a single JSON object whose "topics" keys are the topics copied exactly as given, following this Pydantic schema:
+  ```json
+  {
+    "topics": {
+      "<topic>": {
+        "cards": [
+          {
+            "title": "string",
+            "content": "string"
+          }
+        ]
+      }
+    }
+  }
+  ```
+- Do not include any conversational fluff or explanations outside the JSON structure.
+"""
+
+PROMPT_GENERATE_CARDS_BATCH = """## Topics:
+{user_topics}
+"""
+
+def generate_cards_batch(user_topics: List[str]) -> Dict[str, CardListData]:
+    """
+    Generates cards for several topics with a single LLM request.
+
+    Topics that are already cached are not sent again, and the results are stored
+    in the same cache tiers generate_cards fills (memory, disk and semantic index),
+    so later single-topic lookups hit. The combined response itself is not cached.
+    Topics the LLM did not answer are left out of the result.
+    """
+    results = {}
+    missing_topics = []
+    for user_topic in dict.fromkeys(t for t in user_topics if t):
+        memory_key = memory_cache.key("generate_cards", user_topic)
+        cached = memory_cache.get(memory_key)
+        if cached is None:
+            cached = get_cached_response(get_cache_key(PROMPT_GENERATE_CARDS.format(user_topic=user_topic), SYSTEM_GENERATE_CARDS), CardListData)
+            if cached is not None:
+                memory_cache.put(memory_key, cached)
+        if cached is not None:
+            results[user_topic] = cached
+        else:
+            missing_topics.append(user_topic)
+
+    if not missing_topics:
+        return results
+
+    prompt = PROMPT_GENERATE_CARDS_BATCH.format(user_topics=json.dumps(missing_topics, indent=2, ensure_ascii=False))
+    response_data = call_llm(
+        prompt=prompt,
+        model_speed=ModelSpeed.MEDIUM,
+        expected_schema=CardBatchData,
+        system_message=SYSTEM_GENERATE_CARDS_BATCH,
+        cache=False # Only the per-topic entries below are worth keeping
+    )
+    if not response_data:
+        return results
+
+    semantic_cache = get_semantic_cache()
+    # The LLM sometimes normalizes whitespace or case in the keys
+    answered = {key.strip().lower(): card_list for key, card_list in response_data.topics.items()}
+    for user_topic in missing_topics:
+        card_list = response_data.topics.get(user_topic) or answered.get(user_topic.strip().lower())
+        if card_list is None or not card_list.cards:
+            print(f"Batch response has no cards for topic: {user_topic}")
+            continue
+        prompt = PROMPT_GENERATE_CARDS.format(user_topic=user_topic)
+        save_cached_response(prompt, SYSTEM_GENERATE_CARDS, CardListData, card_list)
+        memory_cache.put(memory_cache.key("generate_cards", user_topic), card_list)
+        if semantic_cache:
+            semantic_cache.add(user_topic, get_cache_key(prompt, SYSTEM_GENERATE_CARDS))
+        results[user_topic] = card_list
+    return results
+
 class ExpandedTopicData(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     markdown_content: str = Field(..., description="The detailed explanation of the topic in Markdown format.")
 
-PROMPT_EXPAND_TOPIC = """
+SYSTEM_EXPAND_TOPIC = """
 # Role: Content Expander Bot
+You are an assistant that expands on topics and outputs valid JSON containing Markdown.
 
 ## Goal:
-Provide a detailed explanation and expansion of the given topic. The output should be in Markdown format.
-
-## Topic to Expand:
-Title: "{topic_title}"
-Content: "{topic_content}"
+Provide a detailed explanation and expansion of the topic given in the user message. The output should be in Markdown format.
 
 ## Instructions:
 - Elaborate on the provided topic title and content.
@@ -87,14 +241,19 @@ Content: "{topic_content}"
 - Aim for a comprehensive yet readable explanation.
 - Output a JSON object following this Pydantic schema:
   ```json
-  {{
+  {
     "markdown_content": "string (Markdown formatted)"
-  }}
+  }
   ```
 - Do not include any conversational fluff or explanations outside the JSON structure. Ensure the entire Markdown output is a single string within the "markdown_content" field.
 """
 
-# The llm.call_llm function already has caching, so we don't need @st.cache_data here
+PROMPT_EXPAND_TOPIC = """## Topic to Expand:
+Title: "{topic_title}"
+Content: "{topic_content}"
+"""
+
+@memory_cache.cached("expand_topic_details")
 def expand_topic_details(topic_title: str, topic_content: str) -> Optional[str]:
     """Expands on a given topic title and content using the LLM, returning Markdown."""
     if not topic_title or not topic_content:
@@ -106,9 +265,38 @@ def expand_topic_details(topic_title: str, topic_content: str) -> Optional[str]:
         prompt=prompt,
         model_speed=ModelSpeed.MEDIUM, # Consider making this configurable or choosing based on expected depth
         expected_schema=ExpandedTopicData,
-        system_message="You are an assistant that expands on topics and outputs valid JSON containing Markdown."
+        system_message=SYSTEM_EXPAND_TOPIC
+    )
+
+    if response_data:
+        return response_data.markdown_content
+    return None
+
+
+def expand_topic_details_stream(topic_title: str, topic_content: str, on_text: Callable[[str], Any]) -> Optional[str]:
+    """Like expand_topic_details, but calls on_text with the Markdown received so far while it streams in."""
+    if not topic_title or not topic_content:
+        return None
+
+    # Shares the memory tier entries of expand_topic_details
+    memory_key = memory_cache.key("expand_topic_details", topic_title, topic_content)
+    markdown_content = memory_cache.get(memory_key)
+    if markdown_content is not None:
+        on_text(markdown_content)
+        return markdown_content
+
+    prompt = PROMPT_EXPAND_TOPIC.format(topic_title=topic_title, topic_content=topic_content)
+
+    response_data = stream_llm(
+        prompt=prompt,
+        model_speed=ModelSpeed.MEDIUM,
+        expected_schema=ExpandedTopicData,
+        stream_field="markdown_content",
+        on_text=on_text,
+        system_message=SYSTEM_EXPAND_TOPIC
     )
 
     if response_data:
+        memory_cache.put(memory_key, response_data.markdown_content)
         return response_data.markdown_content
     return None
@@ -0,0 +1,150 @@
+"""
+Compacts query_cache/ and removes entries that are no longer usable.
+
+Every entry is rewritten as compact JSON in the wrapped {"schema", "key_version", "data"} format,
+entries that do not validate against any current response schema are deleted, entries written
+under an older cache key scheme (without the current key_version, so the app can no longer
+find them) are deleted, and entries with identical content are hardlinked to a single file. Files are only ever replaced atomically
+(and left alone if they changed while being compacted), so the app can keep reading and
+writing the cache during a run. Run it from the wowcards directory:
+
+    python compact_cache.py --dry_run
+    python compact_cache.py
+"""
+import os
+import time
+import argparse
+from hashlib import sha256
+from pydantic import ValidationError
+
+import json_cache
+from json_cache import CACHE_KEY_VERSION, get_json_cache, dump_json, write_file_atomic, schema_fingerprint, is_wrapped
+from card_query import CardListData, CardBatchData, ExpandedTopicData
+
+# The response schemas stored in the cache; entries with a stale schema fingerprint are matched against them in this order
+SCHEMAS = [CardListData, ExpandedTopicData, CardBatchData]
+
+# Temporary files older than this are left over from interrupted writes
+STALE_TMP_SECONDS = 3600
+
+def find_schema(cache) -> tuple:
+    """Returns (schema, validated data) for a wrapped cache entry, or (None, None) if no current schema accepts it."""
+    fingerprints = {schema_fingerprint(schema): schema for schema in SCHEMAS}
+    if cache["schema"] in fingerprints:
+        return fingerprints[cache["schema"]], cache["data"] # Validated when it was written
+    for schema in SCHEMAS:
+        try:
+            return schema, schema.model_validate(cache["data"]).model_dump(mode="json")
+        except ValidationError:
+            continue
+    return None, None
+
+def unchanged(path: str, stat: os.stat_result) -> bool:
+    """True if path is still the file that was read, i.e. nobody rewrote it in the meantime."""
+    try:
+        current = os.stat(path)
+    except FileNotFoundError:
+        return False
+    return (current.st_ino, current.st_mtime_ns, current.st_size) == (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+def disk_usage(cache_dir: str) -> int:
+    """Bytes used by the cache entries, counting hardlinked files once."""
+    inodes = {}
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(".json"):
+            stat = entry.stat()
+            inodes[stat.st_ino] = stat.st_size
+    return sum(inodes.values())
+
+def compact(cache_dir: str, dry_run: bool = False) -> dict:
+    report = {"entries": 0, "rewritten": 0, "dropped": 0, "orphaned": 0, "deduplicated": 0, "skipped": 0, "stale_tmp": 0}
+    report["bytes_before"] = disk_usage(cache_dir)
+    by_content = {} # sha256 of the compacted content -> (path, stat) of the first entry with it
+    compacted_size = 0 # Expected size after compaction, reported by dry runs
+
+    for entry in sorted(os.scandir(cache_dir), key=lambda entry: entry.name):
+        path = entry.path
+        if entry.name.endswith(".tmp"):
+            if time.time() - entry.stat().st_mtime > STALE_TMP_SECONDS:
+                report["stale_tmp"] += 1
+                if not dry_run:
+                    os.remove(path)
+            continue
+        if not entry.name.endswith(".json"):
+            continue
+
+        report["entries"] += 1
+        stat = entry.stat()
+        cache = get_json_cache(entry.name[:-len(".json")], cache_dir=cache_dir)
+        # Unwrapped entries predate key versions, so like older wrapped ones they are under keys the app no longer uses
+        if cache is not None and not (is_wrapped(cache) and cache.get("key_version") == CACHE_KEY_VERSION):
+            print(f"Dropping {entry.name}: written under an older cache key")
+            report["orphaned"] += 1
+            if not dry_run and unchanged(path, stat):
+                os.remove(path)
+            continue
+        schema, data = find_schema(cache) if cache is not None else (None, None)
+        if schema is None:
+            print(f"Dropping {entry.name}: does not match any current schema")
+            report["dropped"] += 1
+            if not dry_run and unchanged(path, stat):
+                os.remove(path)
+            continue
+
+        content = dump_json({"schema": schema_fingerprint(schema), "key_version": CACHE_KEY_VERSION, "data": data})
+        digest = sha256(content).hexdigest()
+        if digest in by_content:
+            original, original_stat = by_content[digest]
+            if stat.st_ino == original_stat.st_ino:
+                continue
+            report["deduplicated"] += 1
+            if dry_run:
+                continue
+            if not unchanged(path, stat) or not unchanged(original, original_stat):
+                report["skipped"] += 1
+                continue
+            tmp_path = f"{path}.{os.getpid()}.link.tmp"
+            os.link(original, tmp_path)
+            os.replace(tmp_path, path) # Atomic, readers see either copy
+            continue
+
+        if content != _read_bytes(path):
+            report["rewritten"] += 1
+            if not dry_run:
+                if not unchanged(path, stat):
+                    report["skipped"] += 1
+                    continue
+                write_file_atomic(path, content)
+        by_content[digest] = (path, stat if dry_run else os.stat(path))
+        compacted_size += len(content)
+
+    report["bytes_after"] = compacted_size if dry_run else disk_usage(cache_dir)
+    return report
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+def print_report(report: dict, dry_run: bool):
+    print(f"\nCache compaction report{' (dry run, nothing changed)' if dry_run else ''}")
+    print(f"  Entries:              {report['entries']}")
+    print(f"  Rewritten compactly:  {report['rewritten']}")
+    print(f"  Dropped (invalid):    {report['dropped']}")
+    print(f"  Dropped (old key):    {report['orphaned']}")
+    print(f"  Deduplicated:         {report['deduplicated']}")
+    print(f"  Skipped (changed):    {report['skipped']}")
+    print(f"  Stale temp files:     {report['stale_tmp']}")
+    reclaimed = report["bytes_before"] - report["bytes_after"]
+    print(f"  Size:                 {report['bytes_before'] / 1024:.1f} KiB -> {report['bytes_after'] / 1024:.1f} KiB ({reclaimed / 1024:.1f} KiB reclaimed)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact the wowcards query cache.")
+    parser.add_argument("--cache_dir", type=str, default=json_cache.CACHE_DIR, help=f"Cache directory (default: {json_cache.CACHE_DIR}).")
+    parser.add_argument("--dry_run", action="store_true", help="Only report what would change.")
+    args = parser.parse_args()
+
+    report = compact(args.cache_dir, dry_run=args.dry_run)
+    print_report(report, args.dry_run)
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,153 @@
 import os
 import json
+import threading
+from hashlib import sha256
+from typing import Type, Optional, Union, get_args, get_origin
+from pydantic import BaseModel
+from cache_manager import CacheManager
 
-def get_json_cache(cacheId):
-    cacheFile = f"query_cache/{cacheId}.json"
+try:
+    import orjson # Optional: several times faster than json for reading and writing cache entries
+except ImportError:
+    orjson = None
+
+# Directory of the persistent query cache; overridable for benchmarks and offline runs
+CACHE_DIR = os.environ.get("WOWCARDS_CACHE_DIR", "query_cache")
+
+# Number of validated Pydantic objects kept in memory per process
+VALIDATED_CACHE_SIZE = 512
+
+# Version of the cache key scheme (llm.get_cache_key). Bump it whenever the keys change: entries
+# written under older keys can no longer be found, and compact_cache.py drops them by this version.
+CACHE_KEY_VERSION = 2
+
+def get_json_cache(cacheId, cache_dir=None):
+    cacheFile = f"{cache_dir or CACHE_DIR}/{cacheId}.json"
 
     if os.path.exists(cacheFile):
         try:
-            with open(cacheFile, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError) as e:
+            with open(cacheFile, 'rb') as f:
+                content = f.read()
+            return orjson.loads(content) if orjson else json.loads(content)
+        except (ValueError, IOError) as e: # orjson.JSONDecodeError and json.JSONDecodeError are ValueErrors
             print(f"Error reading cache file {cacheFile}: {e}")
     return None
 
+def dump_json(data) -> bytes:
+    """Compact JSON encoding used for all cache entries."""
+    return orjson.dumps(data) if orjson else json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+def write_file_atomic(path: str, content: bytes):
+    """Writes via a temporary file and os.replace, so concurrent readers see the old or the new file, never a partial one."""
+    tmpFile = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmpFile, 'wb') as f:
+            f.write(content)
+        os.replace(tmpFile, path)
+    finally:
+        if os.path.exists(tmpFile):
+            os.remove(tmpFile)
+
 def save_json_cache(cacheId, data):
-    cacheFile = f"query_cache/{cacheId}.json"
+    cacheFile = f"{CACHE_DIR}/{cacheId}.json"
 
     try:
-        with open(cacheFile, 'w') as f:
-            json.dump(data, f, indent=4)
+        # Replacing the file, rather than writing into it, also keeps hardlinked duplicates (see compact_cache.py) intact
+        write_file_atomic(cacheFile, dump_json(data))
     except IOError as e:
         print(f"Error writing cache file {cacheFile}: {e}")
 
+# --- Validated cache entries ---
+#
+# Entries written by save_validated_cache are wrapped as
+# {"schema": <fingerprint>, "key_version": <CACHE_KEY_VERSION>, "data": <data>}.
+# The fingerprint identifies the schema the data was validated against when it was written, so
+# entries with the current fingerprint are trusted and rebuilt with model_construct, skipping
+# validation. Older entries (plain data, or another fingerprint) are validated once and rewritten.
+# Entries without the current key_version that are still read by their key are rewritten with it.
+
+_fingerprints = {}
+_validated_objects = CacheManager(max_entries=VALIDATED_CACHE_SIZE)
+
+def schema_fingerprint(schema: Type[BaseModel]) -> str:
+    """Returns a short hash of the JSON schema of a Pydantic model; it changes whenever the model does."""
+    fingerprint = _fingerprints.get(schema)
+    if fingerprint is None:
+        schema_json = json.dumps(schema.model_json_schema(), sort_keys=True)
+        fingerprint = sha256(schema_json.encode('utf-8')).hexdigest()[:16]
+        _fingerprints[schema] = fingerprint
+    return fingerprint
+
+def construct_model(schema: Type[BaseModel], data: dict) -> BaseModel:
+    """Builds a Pydantic object from trusted data without validating it, including nested models."""
+    values = {
+        name: _construct_value(field.annotation, data[name])
+        for name, field in schema.model_fields.items()
+        if name in data
+    }
+    return schema.model_construct(**values)
+
+def _construct_value(annotation, value):
+    if value is None:
+        return None
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return construct_model(annotation, value)
+    origin = get_origin(annotation)
+    args = get_args(annotation)
+    if origin is list and args:
+        return [_construct_value(args[0], item) for item in value]
+    if origin is tuple and len(args) == 2 and args[1] is Ellipsis:
+        return tuple(_construct_value(args[0], item) for item in value)
+    if origin is dict and len(args) == 2:
+        return {key: _construct_value(args[1], item) for key, item in value.items()}
+    if origin is Union:
+        # Optional[Model]: construct with the first model type in the union
+        for arg in args:
+            if isinstance(arg, type) and issubclass(arg, BaseModel):
+                return construct_model(arg, value)
+    return value
+
+def is_wrapped(cache) -> bool:
+    """True for entries written by save_validated_cache, with or without a key_version."""
+    return isinstance(cache, dict) and {"schema", "data"} <= cache.keys() <= {"schema", "key_version", "data"}
+
+def unwrap_cache_data(cache):
+    """Returns the plain response data of a cache entry in either the wrapped or the legacy format."""
+    if is_wrapped(cache):
+        return cache["data"]
+    return cache
+
+def get_validated_cache(cacheId, schema: Type[BaseModel]) -> Optional[BaseModel]:
+    """
+    Returns the cache entry as a schema object, or None if it is missing.
+    Raises pydantic.ValidationError if an untrusted entry does not match the schema.
+    """
+    validated_data = _validated_objects.get((cacheId, schema))
+    if validated_data is not None:
+        return validated_data
+
+    cache = get_json_cache(cacheId)
+    if cache is None:
+        return None
+
+    fingerprint = schema_fingerprint(schema)
+    wrapped = is_wrapped(cache)
+    if wrapped and cache["schema"] == fingerprint:
+        validated_data = construct_model(schema, cache["data"])
+        if cache.get("key_version") != CACHE_KEY_VERSION:
+            save_validated_cache(cacheId, schema, validated_data)
+    else:
+        validated_data = schema.model_validate(cache["data"] if wrapped else cache)
+        save_validated_cache(cacheId, schema, validated_data)
+
+    _validated_objects.put((cacheId, schema), validated_data)
+    return validated_data
+
+def save_validated_cache(cacheId, schema: Type[BaseModel], validated_data: BaseModel):
+    """Saves an object that has been validated against schema, so later reads can skip validation."""
+    save_json_cache(cacheId, {
+        "schema": schema_fingerprint(schema),
+        "key_version": CACHE_KEY_VERSION,
+        "data": validated_data.model_dump(mode="json"),
+    })
+    _validated_objects.put((cacheId, schema), validated_data)
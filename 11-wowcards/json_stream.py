@@ -0,0 +1,98 @@
+import re
+
+_ESCAPES = {
+    '"': '"',
+    '\\': '\\',
+    '/': '/',
+    'b': '\b',
+    'f': '\f',
+    'n': '\n',
+    'r': '\r',
+    't': '\t',
+}
+
+class JsonStringFieldStreamer:
+    """
+    Incrementally extracts the value of one string field from a JSON object
+    that arrives in chunks, e.g. {"markdown_content": "..."} streamed by the LLM.
+
+    feed() returns the newly decoded text so the caller can render it right away.
+    If the value cannot be decoded (a malformed escape), feeding stops and failed is set;
+    the caller should rely on parsing the complete response instead.
+    """
+
+    def __init__(self, field_name: str):
+        self._key_pattern = re.compile(r'"' + re.escape(field_name) + r'"\s*:\s*"')
+        self._buffer = ""
+        self._pos = None  # Position of the next undecoded character inside the string value
+        self.value = ""
+        self.done = False
+        self.failed = False
+
+    def feed(self, chunk: str) -> str:
+        if not chunk or self.done:
+            return ""
+        self._buffer += chunk
+
+        if self._pos is None:
+            match = self._key_pattern.search(self._buffer)
+            if not match:
+                return ""
+            self._pos = match.end()
+
+        decoded = []
+        buffer = self._buffer
+        pos = self._pos
+        try:
+            pos = self._decode(buffer, pos, decoded)
+        except ValueError as e:
+            print(f"Stopped streaming field text, malformed escape: {e}")
+            self.failed = True
+            self.done = True
+
+        self._pos = pos
+        new_text = "".join(decoded)
+        self.value += new_text
+        return new_text
+
+    def _decode(self, buffer: str, pos: int, decoded: list) -> int:
+        """Decodes buffer from pos into decoded until the end of the string or of the data; returns the new position."""
+        while pos < len(buffer):
+            char = buffer[pos]
+            if char == '"':
+                self.done = True
+                pos += 1
+                break
+            if char != '\\':
+                decoded.append(char)
+                pos += 1
+                continue
+            # Escape sequence; wait for more data if it is split across chunks
+            if pos + 1 >= len(buffer):
+                break
+            escape = buffer[pos + 1]
+            if escape == 'u':
+                if pos + 6 > len(buffer):
+                    break
+                code = _parse_hex(buffer[pos + 2:pos + 6])
+                # Surrogate pairs come as two consecutive \uXXXX escapes; a lone surrogate is kept as it is, like json.loads does
+                if 0xD800 <= code <= 0xDBFF:
+                    following = buffer[pos + 6:pos + 12]
+                    if len(following) < 6 and "\\u".startswith(following[:2]):
+                        break # The low surrogate may still be on its way
+                    if following.startswith("\\u") and 0xDC00 <= _parse_hex(following[2:]) <= 0xDFFF:
+                        low = _parse_hex(following[2:])
+                        decoded.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                        pos += 12
+                        continue
+                decoded.append(chr(code))
+                pos += 6
+            else:
+                decoded.append(_ESCAPES.get(escape, escape))
+                pos += 2
+        return pos
+
+def _parse_hex(digits: str) -> int:
+    if len(digits) != 4 or not all(c in "0123456789abcdefABCDEF" for c in digits):
+        raise ValueError(f"invalid \\u escape: \\u{digits}")
+    return int(digits, 16)
@@ -1,23 +1,143 @@
+import os
 import openai
+import httpx
 import streamlit as st
 import json
+import time
+import random
+import importlib.util
 from enum import Enum
 from pydantic import BaseModel, ValidationError
-from typing import Type, Optional, Any
+from typing import Type, Optional, Any, Callable
 from hashlib import sha256
-from json_cache import get_json_cache, save_json_cache
+from json_cache import get_validated_cache, save_validated_cache
+from json_stream import JsonStringFieldStreamer
+from metrics import metrics, HIT, MISS, VALIDATION_FAILURE, API_ERROR, ERROR
+from router import ModelRouter
+from structured_output import response_format_for, format_validation_errors, salvage
 
 # load model configuration from config.json
 with open('config.json', 'r') as f:
     config = json.load(f)
 
+metrics.configure(config.get("metrics", {}), config.get("token_prices", {}))
+
+# --- LLM backends ---
+#
+# "openai": the OpenAI API (default).
+# "ollama": a local model behind an OpenAI-compatible HTTP endpoint, e.g. Ollama's /v1.
+# "stub":   StubLLMClient, a deterministic in-process stand-in that replays cached fixtures.
+# All backends expose the OpenAI client interface (client.chat.completions.create).
+LLM_BACKENDS = ("openai", "ollama", "stub")
+
+_client_override = None
+
+def set_llm_client(client):
+    """Makes the LLM calls use client instead of the configured backend, e.g. a wrapped client. None restores it."""
+    global _client_override
+    _client_override = client
+
+def get_llm_backend() -> str:
+    """Returns the configured backend; the WOWCARDS_LLM_BACKEND environment variable overrides config.json."""
+    backend = os.environ.get("WOWCARDS_LLM_BACKEND") or config.get("llm_backend", "openai")
+    if backend not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM backend '{backend}', expected one of {LLM_BACKENDS}")
+    return backend
+
+def get_llm_client():
+    """Returns the client of the configured LLM backend."""
+    if _client_override is not None:
+        return _client_override
+    backend = get_llm_backend()
+    if backend == "ollama":
+        return _create_ollama_client()
+    if backend == "stub":
+        return _create_stub_client()
+    return get_openai_client()
+
 def get_openai_client():
-    """Initializes and returns the OpenAI client using Streamlit secrets."""
-    api_key = st.secrets.get("openai", {}).get("api_key")
+    """
+    Returns the process-wide OpenAI client, using the API key from Streamlit secrets
+    or, outside Streamlit, the OPENAI_API_KEY environment variable.
+    """
+    try:
+        api_key = st.secrets.get("openai", {}).get("api_key")
+    except FileNotFoundError: # No secrets.toml, e.g. when running a command line tool
+        api_key = None
+    api_key = api_key or os.environ.get("OPENAI_API_KEY")
     if not api_key:
         st.error("OpenAI API key not found. Please set it in Streamlit secrets.")
         st.stop()
-    return openai.OpenAI(api_key=api_key)
+    return _create_openai_client(api_key)
+
+def _create_http_client() -> httpx.Client:
+    client_config = config.get("openai_client", {})
+    return httpx.Client(
+        # HTTP/2 needs the optional h2 package (pip install httpx[http2])
+        http2=importlib.util.find_spec("h2") is not None,
+        limits=httpx.Limits(
+            max_connections=client_config.get("max_connections", 20),
+            max_keepalive_connections=client_config.get("max_keepalive_connections", 10),
+            keepalive_expiry=client_config.get("keepalive_expiry", 30),
+        ),
+        timeout=httpx.Timeout(
+            client_config.get("timeout", 60),
+            connect=client_config.get("connect_timeout", 5),
+        ),
+    )
+
+@st.cache_resource(show_spinner=False)
+def _create_openai_client(api_key: str) -> openai.OpenAI:
+    """
+    Creates one OpenAI client per process so HTTP connections (and their TLS sessions)
+    are kept alive and reused across reruns and sessions instead of being rebuilt per call.
+    """
+    # Retries are done by with_retries so the backoff is configurable
+    return openai.OpenAI(api_key=api_key, http_client=_create_http_client(), max_retries=0)
+
+@st.cache_resource(show_spinner=False)
+def _create_ollama_client() -> openai.OpenAI:
+    ollama_config = config.get("backends", {}).get("ollama", {})
+    return openai.OpenAI(
+        base_url=ollama_config.get("base_url", "http://localhost:11434/v1"),
+        api_key="ollama", # Required by the client, ignored by Ollama
+        http_client=_create_http_client(),
+        max_retries=0,
+    )
+
+@st.cache_resource(show_spinner=False)
+def _create_stub_client():
+    from stub_llm import StubLLMClient
+    stub_config = config.get("backends", {}).get("stub", {})
+    return StubLLMClient(
+        latency=stub_config.get("latency", 0.0),
+        latency_jitter=stub_config.get("latency_jitter", 0.0),
+        fixtures_dir=stub_config.get("fixtures_dir"),
+        fixture_key=get_messages_cache_key,
+    )
+
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError, # Includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+def with_retries(request: Callable[[], Any]) -> Any:
+    """Calls request, retrying transient API errors with exponential backoff and full jitter."""
+    client_config = config.get("openai_client", {})
+    max_retries = client_config.get("max_retries", 3)
+    base_delay = client_config.get("retry_base_delay", 0.5)
+    max_delay = client_config.get("retry_max_delay", 8)
+
+    for attempt in range(max_retries + 1):
+        try:
+            return request()
+        except RETRYABLE_ERRORS as e:
+            if attempt == max_retries:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            print(f"OpenAI request failed ({e.__class__.__name__}), retrying in {delay:.2f}s ({attempt + 1}/{max_retries})")
+            time.sleep(delay)
 
 
 class ModelSpeed(Enum):
@@ -25,8 +145,104 @@ class ModelSpeed(Enum):
     MEDIUM = "medium"
     BEST = "best"
 
+# Adaptive tier selection, see router.py; disabled unless router.enabled is set in config.json
+router_config = dict(config.get("router", {}))
+router = ModelRouter([ModelSpeed.FAST, ModelSpeed.MEDIUM, ModelSpeed.BEST], **router_config) if router_config.pop("enabled", False) else None
+
 def get_model(model_speed: ModelSpeed) -> str:
-    return config["openai_models"][model_speed.value]
+    backend = get_llm_backend()
+    if backend == "openai":
+        return config["openai_models"][model_speed.value]
+    return config["backends"][backend]["models"][model_speed.value]
+
+# --- Structured output ---
+#
+# Requests carry a strict JSON schema generated from the expected Pydantic model, so the
+# response always has the right shape. Constraints the schema cannot express (lengths, counts)
+# are still checked on validation; a response that fails is sent back with the errors, at
+# most max_repairs times, and finally reduced to its valid items (see structured_output.py).
+structured_output_config = config.get("structured_output", {})
+MAX_REPAIRS = structured_output_config.get("max_repairs", 1)
+
+REPAIR_PROMPT = """Your JSON response did not pass validation:
+{problems}
+
+Fix only the values listed above and keep everything else exactly as it was. Respond with the complete corrected JSON object and nothing else."""
+
+def get_response_format(expected_schema: Type[BaseModel]) -> dict:
+    if structured_output_config.get("strict_schema", True):
+        return response_format_for(expected_schema)
+    return {"type": "json_object"}
+
+def validate_with_repairs(client, messages: list, response_content: str, expected_schema: Type[BaseModel],
+                          model_speed: ModelSpeed, model: str, temperature: float) -> Optional[BaseModel]:
+    """
+    Parses and validates an LLM response, asking the model to repair it when it is invalid.
+    Returns the validated object, the valid part of the last response, or None if nothing usable is left.
+    """
+    data = None
+    for attempt in range(MAX_REPAIRS + 1):
+        try:
+            data = json.loads(response_content)
+            return expected_schema.model_validate(data)
+        except json.JSONDecodeError as e:
+            data = None
+            problems = f"- (root): not valid JSON: {e}"
+        except ValidationError as e:
+            problems = format_validation_errors(e)
+        print(f"Invalid LLM response (attempt {attempt + 1} of {MAX_REPAIRS + 1}):\n{problems}")
+        if attempt == MAX_REPAIRS:
+            break
+
+        messages = messages + [
+            {"role": "assistant", "content": response_content},
+            {"role": "user", "content": REPAIR_PROMPT.format(problems=problems)},
+        ]
+        start_time = time.perf_counter()
+        try:
+            completion = with_retries(lambda: client.chat.completions.create(
+                model=model,
+                messages=messages,
+                response_format=get_response_format(expected_schema),
+                temperature=temperature,
+            ))
+        except openai.APIError as e:
+            metrics.record_call(model_speed.value, "repair", API_ERROR, time.perf_counter() - start_time, model)
+            print(f"Repair request failed: {e}")
+            break
+        metrics.record_call(model_speed.value, "repair", MISS, time.perf_counter() - start_time, model, completion.usage)
+        response_content = completion.choices[0].message.content
+
+    return salvage(expected_schema, data)
+
+def get_cache_key(prompt: str, system_message: str) -> str:
+    """
+    Returns the cache key used for responses to prompt; the instructions in system_message are part of the request too.
+    Bump json_cache.CACHE_KEY_VERSION when changing how keys are derived.
+    """
+    return sha256(json.dumps([system_message, prompt]).encode('utf-8')).hexdigest()
+
+def get_messages_cache_key(messages: list) -> str:
+    """Returns the cache key of a [system, user] chat request as built by call_llm and stream_llm."""
+    return get_cache_key(messages[-1]["content"], messages[0]["content"])
+
+def save_cached_response(prompt: str, system_message: str, expected_schema: Type[BaseModel], data: BaseModel):
+    """Stores an already validated response as the cached response for prompt."""
+    save_validated_cache(get_cache_key(prompt, system_message), expected_schema, data)
+
+def get_cached_response(cache_key: str, expected_schema: Type[BaseModel]) -> Optional[BaseModel]:
+    """Returns the cached response for cache_key validated against expected_schema, or None."""
+    try:
+        # Trusted entries are rebuilt without validation, older ones are validated against the schema
+        validated_data = get_validated_cache(cache_key, expected_schema)
+        if validated_data is not None:
+            print(f"Cache hit for key: {cache_key}")
+            return validated_data
+    except ValidationError as e:
+        print(f"Cache found for key '{cache_key}' but failed validation: {e}. Re-fetching.")
+    except Exception as e:
+        print(f"Error processing cache for key '{cache_key}': {e}. Re-fetching.")
+    return None
 
 def call_llm(
     prompt: str,
@@ -34,75 +250,190 @@ def call_llm(
     expected_schema: Type[BaseModel],
     system_message: str = "You are a helpful assistant. Output JSON.",
     temperature: float = 0.7,
+    cache: bool = True,
 ) -> Optional[BaseModel]:
     """
     Calls the OpenAI API with caching and validates the response against a Pydantic schema.
 
     Args:
         cache_key: Key for caching the response.
-        prompt: The user prompt to send to the LLM.
+        prompt: The variable part of the request, sent last as the user message.
         model: The OpenAI model to use.
         response_format: The desired response format (e.g., {"type": "json_object"}).
         expected_schema: The Pydantic model to validate the response against.
-        system_message: The system message for the LLM.
+        system_message: The static instructions, sent first so the provider can cache this prompt prefix.
         temperature: The sampling temperature for the LLM.
+        cache: Whether to read and write the response in the disk cache; off for responses the caller stores in parts.
 
     Returns:
         A Pydantic object matching the expected_schema if successful, None otherwise.
     """
-    cache_key = sha256(prompt.encode('utf-8')).hexdigest()
-    cache = get_json_cache(cache_key)
-    
-    if cache is not None:
-        try:
-            # Validate cached data against the schema
-            validated_data = expected_schema.model_validate(cache)
-            print(f"Cache hit and validated for key: {cache_key}")
-            return validated_data
-        except ValidationError as e:
-            print(f"Cache found for key '{cache_key}' but failed validation: {e}. Re-fetching.")
-        except Exception as e:
-            print(f"Error processing cache for key '{cache_key}': {e}. Re-fetching.")
+    start_time = time.perf_counter()
+    cache_key = get_cache_key(prompt, system_message)
+    cached_data = get_cached_response(cache_key, expected_schema) if cache else None
+    if cached_data is not None:
+        metrics.record_call(model_speed.value, "disk", HIT, time.perf_counter() - start_time)
+        return cached_data
 
-    print(f"Cache miss or invalid for key: {cache_key}. Calling OpenAI API...")
-    client = get_openai_client()
+    print(f"Cache miss or invalid for key: {cache_key}. Calling the LLM...")
+    client = get_llm_client()
 
-    selectedModel = config["openai_models"][model_speed.value]
+    if router:
+        model_speed = router.choose(model_speed, prompt)
+    selectedModel = get_model(model_speed)
     print(f"Selected model: {selectedModel}")
 
     response_content = None # Initialize in case of early exit
-    try:
-        completion = client.chat.completions.create(
-            model=selectedModel,
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"},
+    usage = None
+    def record(outcome):
+        metrics.record_call(model_speed.value, "api", outcome, time.perf_counter() - start_time, selectedModel, usage)
+
+    messages = [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": prompt}
+    ]
+    def request(speed):
+        return with_retries(lambda: client.chat.completions.create(
+            model=get_model(speed),
+            messages=messages,
+            response_format=get_response_format(expected_schema),
             temperature=temperature,
-        )
+        ))
+
+    try:
+        if router:
+            # May answer from the fastest tier if the chosen one is slow (hedged request)
+            model_speed, completion = router.run_hedged(model_speed, prompt, request)
+            selectedModel = get_model(model_speed)
+        else:
+            completion = request(model_speed)
+        usage = completion.usage
         response_content = completion.choices[0].message.content
 
         print(f"Response content: {response_content}")
-        # Parse the JSON string response
-        data = json.loads(response_content)
+        # Parse and validate against the Pydantic schema, repairing invalid responses
+        validated_data = validate_with_repairs(client, messages, response_content, expected_schema,
+                                               model_speed, selectedModel, temperature)
+        if validated_data is None:
+            record(VALIDATION_FAILURE)
+            st.error("The LLM response did not match the expected format, even after asking it to repair it.")
+            print(f"Response: {response_content}")
+            return None
+
+        # Save the validated data with the schema fingerprint, so cache hits can skip validation
+        if cache:
+            save_validated_cache(cache_key, expected_schema, validated_data)
+        print(f"Successfully fetched and validated data for key: {cache_key}")
+        record(MISS)
+        return validated_data
+
+    except openai.APIError as e:
+        record(API_ERROR)
+        st.error(f"OpenAI API returned an API Error: {e}")
+    except Exception as e:
+        record(ERROR)
+        st.error(f"An unexpected error occurred: {e}")
+
+    return None # Return None in case of any errors 
+
+def stream_llm(
+    prompt: str,
+    model_speed: ModelSpeed,
+    expected_schema: Type[BaseModel],
+    stream_field: str,
+    on_text: Callable[[str], Any],
+    system_message: str = "You are a helpful assistant. Output JSON.",
+    temperature: float = 0.7,
+) -> Optional[BaseModel]:
+    """
+    Like call_llm, but streams the response and reports the text of stream_field as it arrives.
 
-        # Validate the parsed data against the Pydantic schema
-        validated_data = expected_schema.model_validate(data)
+    Args:
+        prompt: The variable part of the request, sent last as the user message.
+        model_speed: The speed of the model to use.
+        expected_schema: The Pydantic model to validate the complete response against.
+        stream_field: The top-level string field of the JSON response to stream.
+        on_text: Called with the text of stream_field received so far, every time it grows.
+        system_message: The static instructions, sent first so the provider can cache this prompt prefix.
+        temperature: The sampling temperature for the LLM.
 
-        # Save the original *parsed JSON data* to cache, not the validated Pydantic object
-        save_json_cache(cache_key, data)
-        print(f"Successfully fetched, validated, and cached data for key: {cache_key}")
+    Returns:
+        A Pydantic object matching the expected_schema if successful, None otherwise.
+    """
+    start_time = time.perf_counter()
+    cache_key = get_cache_key(prompt, system_message)
+    cached_data = get_cached_response(cache_key, expected_schema)
+    if cached_data is not None:
+        metrics.record_call(model_speed.value, "disk", HIT, time.perf_counter() - start_time)
+        on_text(getattr(cached_data, stream_field))
+        return cached_data
+
+    print(f"Cache miss or invalid for key: {cache_key}. Streaming from the LLM...")
+    client = get_llm_client()
+
+    if router:
+        model_speed = router.choose(model_speed, prompt)
+    selectedModel = get_model(model_speed)
+    print(f"Selected model: {selectedModel}")
+
+    streamer = JsonStringFieldStreamer(stream_field)
+    response_content = None # Initialize in case of early exit
+    usage = None
+    def record(outcome):
+        metrics.record_call(model_speed.value, "api", outcome, time.perf_counter() - start_time, selectedModel, usage)
+
+    messages = [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": prompt}
+    ]
+    def request():
+        nonlocal usage
+        stream = with_retries(lambda: client.chat.completions.create(
+            model=selectedModel,
+            messages=messages,
+            response_format=get_response_format(expected_schema),
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True},
+        ))
+        chunks = []
+        for chunk in stream:
+            if chunk.usage:
+                usage = chunk.usage # Sent in a final chunk without choices
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            chunks.append(delta)
+            if streamer.feed(delta):
+                on_text(streamer.value)
+        return "".join(chunks)
+
+    try:
+        # Streams are not hedged, since the text is already shown while it arrives
+        response_content = router.run(model_speed, prompt, request) if router else request()
+
+        # The complete response is validated, repaired and cached exactly like call_llm does
+        validated_data = validate_with_repairs(client, messages, response_content, expected_schema,
+                                               model_speed, selectedModel, temperature)
+        if validated_data is None:
+            record(VALIDATION_FAILURE)
+            st.error("The LLM response did not match the expected format, even after asking it to repair it.")
+            print(f"Response: {response_content}")
+            return None
+        on_text(getattr(validated_data, stream_field)) # The repaired text may differ from what was streamed
+
+        save_validated_cache(cache_key, expected_schema, validated_data)
+        print(f"Successfully streamed, validated, and cached data for key: {cache_key}")
+        record(MISS)
         return validated_data
 
     except openai.APIError as e:
+        record(API_ERROR)
         st.error(f"OpenAI API returned an API Error: {e}")
-    except json.JSONDecodeError:
-        st.error(f"Failed to decode JSON response from LLM: {response_content}")
-    except ValidationError as e:
-        st.error(f"LLM response failed schema validation: {e}")
-        print(f"Response: {response_content}")
     except Exception as e:
+        record(ERROR)
         st.error(f"An unexpected error occurred: {e}")
 
-    return None # Return None in case of any errors 
\ No newline at end of file
+    return None # Return None in case of any errors
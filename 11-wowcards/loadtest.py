@@ -0,0 +1,159 @@
+"""
+Load test for the wowcards query layer.
+
+Simulates concurrent explorers against the stub LLM backend: each session searches a
+topic, then keeps clicking "Related" or "Dig deeper" on a random card, with random think
+times in between. Reports throughput, latency percentiles per action, cache hit ratios
+and memory growth per session. Run it from the wowcards directory:
+
+    python loadtest.py --sessions 50 --steps 20 --latency 0.8 --think_time 2 --time_scale 0.05
+"""
+import os
+import time
+import random
+import contextlib
+import argparse
+import resource
+import tempfile
+import threading
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import json_cache
+from llm import set_llm_client, get_messages_cache_key
+from card_query import generate_cards, expand_topic_details, related_query, memory_cache
+from metrics import metrics, HIT
+from stub_llm import StubLLMClient
+
+SEED_TOPICS = [
+    "10 random cards",
+    "Space travel",
+    "The history of mathematics",
+    "How the immune system works",
+    "Renewable energy",
+    "Ancient Rome",
+    "Machine learning basics",
+    "Jazz improvisation",
+]
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+class LoadTestResults:
+    """Latencies per action type, collected from all session threads."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.failures = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, action: str, latency: float, ok: bool):
+        with self._lock:
+            self.latencies[action].append(latency)
+            if not ok:
+                self.failures[action] += 1
+
+def run_session(session_id: int, steps: int, related_probability: float, think_time: float,
+                time_scale: float, results: LoadTestResults):
+    """One explorer: search, then related / dig deeper on random cards with think times in between."""
+    rng = random.Random(session_id)
+
+    def think():
+        if think_time:
+            time.sleep(rng.expovariate(1.0 / think_time) * time_scale)
+
+    def timed(action, function, *args):
+        start_time = time.perf_counter()
+        result = function(*args)
+        results.record(action, time.perf_counter() - start_time, bool(result))
+        return result
+
+    card_list = timed("search", generate_cards, rng.choice(SEED_TOPICS))
+    for _ in range(steps):
+        if not card_list or not card_list.cards:
+            break
+        think()
+        card = rng.choice(card_list.cards)
+        if rng.random() < related_probability:
+            card_list = timed("related", generate_cards, related_query(card)) or card_list
+        else:
+            timed("dig_deeper", expand_topic_details, card.title, card.content)
+
+def print_report(results: LoadTestResults, sessions: int, elapsed: float, memory_growth: int, memory_source: str,
+                 stub: StubLLMClient):
+    total_actions = sum(len(latencies) for latencies in results.latencies.values())
+    print("\nLoad test report")
+    print(f"  Sessions:              {sessions}")
+    print(f"  Actions:               {total_actions} in {elapsed:.1f}s ({total_actions / elapsed:.1f} actions/s)")
+    print(f"  {'action':<12} {'count':>7} {'failed':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for action, latencies in sorted(results.latencies.items()):
+        latencies = sorted(latencies)
+        print(f"  {action:<12} {len(latencies):>7} {results.failures[action]:>7} "
+              f"{percentile(latencies, 0.50):>8.3f} {percentile(latencies, 0.95):>8.3f} "
+              f"{percentile(latencies, 0.99):>8.3f} {latencies[-1]:>8.3f}")
+
+    rows = metrics.summary()
+    calls = sum(row["calls"] for row in rows)
+    hits = sum(row["calls"] for row in rows if row["outcome"] == HIT)
+    memory_stats = memory_cache.stats()
+    print(f"  Memory tier hit ratio: {memory_stats['hit_rate']:.0%} ({memory_stats['entries']} entries, {memory_stats['size_bytes'] / 1024:.0f} KiB)")
+    print(f"  Disk tier hit ratio:   {hits / calls if calls else 0:.0%} of {calls} call_llm calls")
+    print(f"  LLM requests:          {stub.requests}")
+    print(f"  Memory growth:         {memory_growth / 1024:.0f} KiB total, {memory_growth / sessions / 1024:.1f} KiB per session ({memory_source})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the wowcards query layer against the stub LLM.")
+    parser.add_argument("--sessions", type=int, default=20, help="Number of concurrent explorer sessions (default: 20).")
+    parser.add_argument("--steps", type=int, default=10, help="Related/Dig deeper clicks per session after the first search (default: 10).")
+    parser.add_argument("--related_probability", type=float, default=0.6, help="Chance that a click is Related rather than Dig deeper (default: 0.6).")
+    parser.add_argument("--think_time", type=float, default=5.0, help="Mean think time between clicks in seconds (default: 5).")
+    parser.add_argument("--time_scale", type=float, default=0.1, help="Multiplier applied to think times to shorten runs (default: 0.1).")
+    parser.add_argument("--latency", type=float, default=0.8, help="Stub LLM latency per request in seconds (default: 0.8).")
+    parser.add_argument("--latency_jitter", type=float, default=0.4, help="Extra random stub latency in seconds (default: 0.4).")
+    parser.add_argument("--cache_dir", type=str, help="Query cache directory; defaults to a new empty temporary directory.")
+    parser.add_argument("--verbose", action="store_true", help="Show the query layer's log output during the run.")
+    parser.add_argument("--trace_memory", action="store_true", help="Measure Python heap growth with tracemalloc instead of peak RSS (slower).")
+    args = parser.parse_args()
+
+    json_cache.CACHE_DIR = args.cache_dir or tempfile.mkdtemp(prefix="wowcards_loadtest_")
+    print(f"Using query cache directory {json_cache.CACHE_DIR}")
+    stub = StubLLMClient(
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        fixture_key=get_messages_cache_key,
+    )
+    set_llm_client(stub)
+    metrics.jsonl_file = None # Keep synthetic calls out of the spend log
+
+    if args.trace_memory:
+        tracemalloc.start()
+        memory_before = tracemalloc.get_traced_memory()[0]
+    else:
+        memory_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 # KiB on Linux
+
+    results = LoadTestResults()
+    start_time = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull):
+        with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+            futures = [
+                executor.submit(run_session, session_id, args.steps, args.related_probability,
+                                args.think_time, args.time_scale, results)
+                for session_id in range(args.sessions)
+            ]
+            for future in futures:
+                future.result()
+    elapsed = time.perf_counter() - start_time
+
+    if args.trace_memory:
+        memory_growth = tracemalloc.get_traced_memory()[0] - memory_before
+        memory_source = "tracemalloc"
+    else:
+        memory_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 - memory_before
+        memory_source = "peak RSS"
+    print_report(results, args.sessions, elapsed, memory_growth, memory_source, stub)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import os
+import json
+import atexit
+import threading
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Number of recent latencies kept per label set for exact percentiles on the admin page
+RECENT_LATENCIES = 1000
+
+# The JSONL spend log is written by a background thread every FLUSH_INTERVAL seconds, or sooner once FLUSH_EVERY events are pending
+FLUSH_INTERVAL = 5.0
+FLUSH_EVERY = 100
+
+# Outcomes of an LLM call
+HIT = "hit"
+MISS = "miss"
+VALIDATION_FAILURE = "validation_failure"
+API_ERROR = "api_error"
+ERROR = "error"
+
+class Metrics:
+    """
+    Process-wide counters and latency histograms for LLM calls, labelled by model_speed, cache tier and outcome.
+    Cache hits are only counted in memory; calls that reach a model are also appended to the JSONL spend log,
+    in batches off the request path.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = defaultdict(int)
+        self.latency_sum = defaultdict(float)
+        self.latency_buckets = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+        self.recent_latencies = defaultdict(lambda: deque(maxlen=RECENT_LATENCIES))
+        self.tokens = defaultdict(int)
+        self.cost = defaultdict(float)
+        self.jsonl_file = None
+        self.token_prices = {}
+        self._pending = [] # Events not yet written to jsonl_file
+        self._write_lock = threading.Lock()
+        self._flush_requested = threading.Event()
+        self._writer = None
+
+    def configure(self, metrics_config: dict, token_prices: dict):
+        self.jsonl_file = metrics_config.get("jsonl_file")
+        self.token_prices = token_prices
+        if self.jsonl_file and self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, daemon=True)
+            self._writer.start()
+            atexit.register(self.flush)
+
+    def record_call(self, model_speed: str, tier: str, outcome: str, latency: float,
+                    model: Optional[str] = None, usage=None):
+        """Records one call_llm outcome; usage is the completion.usage of an API call, if any."""
+        labels = (model_speed, tier, outcome)
+        event = {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "model_speed": model_speed,
+            "tier": tier,
+            "outcome": outcome,
+            "latency": round(latency, 4),
+        }
+        with self._lock:
+            self.calls[labels] += 1
+            self.latency_sum[labels] += latency
+            buckets = self.latency_buckets[labels]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    buckets[i] += 1
+            self.recent_latencies[labels].append(latency)
+
+            if usage is not None and model:
+                prompt_tokens = usage.prompt_tokens or 0
+                completion_tokens = usage.completion_tokens or 0
+                # Prompt tokens served from the provider's prompt cache (a subset of prompt_tokens)
+                details = getattr(usage, "prompt_tokens_details", None)
+                cached_tokens = (getattr(details, "cached_tokens", None) or 0) if details else 0
+                self.tokens[(model, "prompt")] += prompt_tokens
+                self.tokens[(model, "cached_prompt")] += cached_tokens
+                self.tokens[(model, "completion")] += completion_tokens
+                prices = self.token_prices.get(model, {})
+                prompt_price = prices.get("prompt", 0)
+                cost = ((prompt_tokens - cached_tokens) * prompt_price
+                        + cached_tokens * prices.get("cached_prompt", prompt_price)
+                        + completion_tokens * prices.get("completion", 0)) / 1_000_000
+                self.cost[model] += cost
+                event.update(model=model, prompt_tokens=prompt_tokens, cached_tokens=cached_tokens,
+                             completion_tokens=completion_tokens, cost=cost)
+
+            if self.jsonl_file and outcome != HIT:
+                self._pending.append(event)
+                if len(self._pending) >= FLUSH_EVERY:
+                    self._flush_requested.set()
+
+    def flush(self):
+        """Appends the pending events to the JSONL file."""
+        with self._write_lock:
+            with self._lock:
+                events, self._pending = self._pending, []
+                jsonl_file = self.jsonl_file
+            if not events or not jsonl_file:
+                return
+            try:
+                os.makedirs(os.path.dirname(jsonl_file) or ".", exist_ok=True)
+                with open(jsonl_file, 'a') as f:
+                    f.write("".join(json.dumps(event) + "\n" for event in events))
+            except IOError as e:
+                print(f"Error writing metrics file {jsonl_file}: {e}")
+
+    def _write_loop(self):
+        while True:
+            self._flush_requested.wait(FLUSH_INTERVAL)
+            self._flush_requested.clear()
+            self.flush()
+
+    def summary(self) -> list:
+        """Returns one row per label set with the call count and latency percentiles."""
+        rows = []
+        with self._lock:
+            for (model_speed, tier, outcome), count in sorted(self.calls.items()):
+                latencies = sorted(self.recent_latencies[(model_speed, tier, outcome)])
+                rows.append({
+                    "model_speed": model_speed,
+                    "tier": tier,
+                    "outcome": outcome,
+                    "calls": count,
+                    "mean_latency": self.latency_sum[(model_speed, tier, outcome)] / count,
+                    "p50_latency": _percentile(latencies, 0.50),
+                    "p95_latency": _percentile(latencies, 0.95),
+                })
+        return rows
+
+    def to_prometheus(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP wowcards_llm_calls_total LLM calls by model speed, cache tier and outcome.",
+            "# TYPE wowcards_llm_calls_total counter",
+        ]
+        with self._lock:
+            for labels, count in sorted(self.calls.items()):
+                lines.append(f"wowcards_llm_calls_total{{{_labels(labels)}}} {count}")
+
+            lines += [
+                "# HELP wowcards_llm_latency_seconds Latency of LLM calls including cache lookups.",
+                "# TYPE wowcards_llm_latency_seconds histogram",
+            ]
+            for labels, buckets in sorted(self.latency_buckets.items()):
+                label_text = _labels(labels)
+                for bound, bucket_count in zip(LATENCY_BUCKETS, buckets):
+                    lines.append(f'wowcards_llm_latency_seconds_bucket{{{label_text},le="{bound}"}} {bucket_count}')
+                lines.append(f'wowcards_llm_latency_seconds_bucket{{{label_text},le="+Inf"}} {self.calls[labels]}')
+                lines.append(f"wowcards_llm_latency_seconds_sum{{{label_text}}} {self.latency_sum[labels]}")
+                lines.append(f"wowcards_llm_latency_seconds_count{{{label_text}}} {self.calls[labels]}")
+
+            lines += [
+                "# HELP wowcards_llm_tokens_total Tokens reported in completion.usage.",
+                "# TYPE wowcards_llm_tokens_total counter",
+            ]
+            for (model, kind), count in sorted(self.tokens.items()):
+                lines.append(f'wowcards_llm_tokens_total{{model="{model}",kind="{kind}"}} {count}')
+
+            lines += [
+                "# HELP wowcards_llm_cost_dollars_total Estimated spend from token_prices in config.json.",
+                "# TYPE wowcards_llm_cost_dollars_total counter",
+            ]
+            for model, cost in sorted(self.cost.items()):
+                lines.append(f'wowcards_llm_cost_dollars_total{{model="{model}"}} {cost}')
+        return "\n".join(lines) + "\n"
+
+def _labels(labels: tuple) -> str:
+    model_speed, tier, outcome = labels
+    return f'model_speed="{model_speed}",tier="{tier}",outcome="{outcome}"'
+
+def _percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def read_daily_spend(jsonl_file: str) -> dict:
+    """Sums the LLM calls, estimated cost and tokens per UTC day from the JSONL metrics file."""
+    days = defaultdict(lambda: {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "cost": 0.0})
+    if not jsonl_file or not os.path.exists(jsonl_file):
+        return {}
+    with open(jsonl_file, 'r') as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            day = days[event["time"][:10]]
+            day["calls"] += 1
+            day["prompt_tokens"] += event.get("prompt_tokens", 0)
+            day["cached_tokens"] += event.get("cached_tokens", 0)
+            day["completion_tokens"] += event.get("completion_tokens", 0)
+            day["cost"] += event.get("cost", 0.0)
+    return dict(sorted(days.items()))
+
+metrics = Metrics()
+
+class _PrometheusHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = metrics.to_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Keep scrapes out of the console
+
+def start_prometheus_server(port: int) -> ThreadingHTTPServer:
+    """Serves the metrics in Prometheus text format on http://localhost:<port>/ from a daemon thread."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), _PrometheusHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving Prometheus metrics on http://127.0.0.1:{port}/metrics")
+    return server
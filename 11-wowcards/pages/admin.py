@@ -0,0 +1,44 @@
+import streamlit as st
+from llm import config, router
+from metrics import metrics, read_daily_spend
+from card_query import get_semantic_cache, memory_cache
+
+st.set_page_config(page_title="Admin", page_icon=":bar_chart:", layout="wide")
+
+st.header("LLM calls")
+rows = metrics.summary()
+if rows:
+    calls = sum(row["calls"] for row in rows)
+    hits = sum(row["calls"] for row in rows if row["outcome"] == "hit")
+    st.metric("Cache hit rate (this process)", f"{hits / calls:.0%}", help=f"{hits} of {calls} calls")
+    prompt_tokens = sum(count for (model, kind), count in metrics.tokens.items() if kind == "prompt")
+    cached_tokens = sum(count for (model, kind), count in metrics.tokens.items() if kind == "cached_prompt")
+    if prompt_tokens:
+        st.metric("Prompt tokens cached by the provider", f"{cached_tokens / prompt_tokens:.0%}", help=f"{cached_tokens} of {prompt_tokens} prompt tokens")
+    st.dataframe(rows, use_container_width=True)
+else:
+    st.write("No LLM calls since the app was started.")
+
+st.subheader("Memory cache")
+st.json(memory_cache.stats())
+
+if router:
+    st.subheader("Model routing")
+    st.json(router.stats())
+
+semantic_cache = get_semantic_cache()
+if semantic_cache:
+    st.subheader("Semantic cache")
+    st.json(semantic_cache.stats())
+
+st.header("Daily spend")
+jsonl_file = config.get("metrics", {}).get("jsonl_file")
+metrics.flush() # Include the calls still waiting to be written
+daily_spend = read_daily_spend(jsonl_file)
+if daily_spend:
+    st.dataframe([{"day": day, **totals} for day, totals in daily_spend.items()], use_container_width=True)
+else:
+    st.write(f"No metrics file found at {jsonl_file}.")
+
+with st.expander("Prometheus text"):
+    st.code(metrics.to_prometheus(), language="text")
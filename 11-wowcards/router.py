@@ -0,0 +1,121 @@
+import time
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, List
+
+def _percentile(sorted_values: list, fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+class ModelRouter:
+    """
+    Picks the model tier for each LLM request.
+
+    The call site asks for a preferred tier; the router steps down to faster tiers while the
+    preferred one is predicted to miss the latency SLO (its recent p95 latency, scaled up for
+    prompts longer than it usually gets), fails too often, or already has too many requests in
+    flight. Observations older than recovery_seconds are forgotten, so a tier that was avoided
+    during a provider slowdown is tried again afterwards.
+
+    Tiers are given as a list ordered from fastest to slowest, e.g. [FAST, MEDIUM, BEST].
+    """
+
+    def __init__(self, tiers: List[Any], latency_slo: float = 8.0, max_error_rate: float = 0.2,
+                 max_in_flight: int = 8, window: int = 50, min_observations: int = 5,
+                 recovery_seconds: float = 60.0, hedge: bool = False, hedge_after: float = 4.0):
+        self.tiers = tiers
+        self.latency_slo = latency_slo
+        self.max_error_rate = max_error_rate
+        self.max_in_flight = max_in_flight
+        self.min_observations = min_observations
+        self.recovery_seconds = recovery_seconds
+        self.hedge = hedge
+        self.hedge_after = hedge_after
+        self._observations = defaultdict(lambda: deque(maxlen=window)) # tier -> (time, latency, ok, prompt_chars)
+        self._in_flight = defaultdict(int)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(4, max_in_flight), thread_name_prefix="hedge")
+
+    def _recent(self, tier) -> list:
+        cutoff = time.monotonic() - self.recovery_seconds
+        return [observation for observation in self._observations[tier] if observation[0] >= cutoff]
+
+    def _is_healthy(self, tier, prompt_chars: int) -> bool:
+        if self._in_flight[tier] >= self.max_in_flight:
+            return False
+        observations = self._recent(tier)
+        if len(observations) < self.min_observations:
+            return True # Not enough recent data, so give the tier a chance
+        errors = sum(1 for observation in observations if not observation[2])
+        if errors / len(observations) > self.max_error_rate:
+            return False
+        latencies = sorted(observation[1] for observation in observations if observation[2])
+        if not latencies:
+            return False
+        typical_chars = sum(observation[3] for observation in observations) / len(observations)
+        predicted_p95 = _percentile(latencies, 0.95) * max(1.0, prompt_chars / max(typical_chars, 1))
+        return predicted_p95 <= self.latency_slo
+
+    def choose(self, preferred, prompt: str):
+        """Returns the slowest tier, starting at preferred, that is expected to meet the SLO; the fastest tier otherwise."""
+        with self._lock:
+            for tier in reversed(self.tiers[:self.tiers.index(preferred) + 1]):
+                if self._is_healthy(tier, len(prompt)):
+                    if tier != preferred:
+                        print(f"Router: using {tier.value} instead of {preferred.value}")
+                    return tier
+        return self.tiers[0]
+
+    def run(self, tier, prompt: str, request: Callable[[], Any]) -> Any:
+        """Calls request for tier, tracking it as in flight and observing its latency and success."""
+        with self._lock:
+            self._in_flight[tier] += 1
+        start_time = time.perf_counter()
+        ok = False
+        try:
+            result = request()
+            ok = True
+            return result
+        finally:
+            with self._lock:
+                self._in_flight[tier] -= 1
+                self._observations[tier].append((time.monotonic(), time.perf_counter() - start_time, ok, len(prompt)))
+
+    def run_hedged(self, tier, prompt: str, request: Callable[[Any], Any]) -> tuple:
+        """
+        Calls request(tier); if it has not answered after hedge_after seconds, also calls
+        request(fastest tier) and returns whichever succeeds first, as (tier, result).
+        """
+        fastest = self.tiers[0]
+        if not self.hedge or tier == fastest:
+            return tier, self.run(tier, prompt, lambda: request(tier))
+
+        futures = {self._executor.submit(self.run, tier, prompt, lambda: request(tier)): tier}
+        done, _ = wait(futures, timeout=self.hedge_after)
+        if not done:
+            print(f"Router: no answer from {tier.value} after {self.hedge_after}s, hedging with {fastest.value}")
+            futures[self._executor.submit(self.run, fastest, prompt, lambda: request(fastest))] = fastest
+
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return futures[future], future.result() # The slower request finishes in the background
+                error = future.exception()
+        raise error
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {}
+            for tier in self.tiers:
+                observations = self._recent(tier)
+                latencies = sorted(observation[1] for observation in observations if observation[2])
+                stats[tier.value] = {
+                    "recent_requests": len(observations),
+                    "error_rate": sum(1 for observation in observations if not observation[2]) / len(observations) if observations else 0.0,
+                    "p95_latency": _percentile(latencies, 0.95) if latencies else None,
+                    "in_flight": self._in_flight[tier],
+                }
+            return stats
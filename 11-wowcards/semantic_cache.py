@@ -0,0 +1,202 @@
+import os
+import re
+import atexit
+import threading
+from collections import OrderedDict
+import numpy as np
+from hashlib import blake2b
+from typing import List, Optional
+from json_cache import CACHE_DIR
+
+INDEX_FILE = os.path.join(CACHE_DIR, "semantic_index.npz")
+
+# Rows allocated for the first vectors; the matrix doubles whenever it is full
+INITIAL_CAPACITY = 1024
+
+# Vectors embedded by lookup and kept for add, so a miss costs one embedding request instead of two
+RECENT_VECTORS = 256
+
+def normalize_query(query: str) -> str:
+    """Lowercases the query and strips punctuation and repeated whitespace."""
+    query = re.sub(r"[^\w\s]", " ", query.lower())
+    return " ".join(query.split())
+
+class HashingEmbedder:
+    """
+    Local, deterministic embedder based on hashed character trigrams.
+    Needs no network access, so it can stand in for the OpenAI embedder offline and in tests.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            padded = f" {text} "
+            for i in range(len(padded) - 2):
+                digest = blake2b(padded[i:i + 3].encode("utf-8"), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                sign = 1.0 if digest[4] & 1 else -1.0
+                vectors[row, bucket] += sign
+        return vectors
+
+class OpenAIEmbedder:
+    """Embeds texts with the OpenAI embeddings API."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.name = model
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        from llm import get_openai_client, with_retries
+        client = get_openai_client()
+        response = with_retries(lambda: client.embeddings.create(model=self.model, input=texts))
+        return np.array([item.embedding for item in response.data], dtype=np.float32)
+
+class SemanticCache:
+    """
+    Maps queries to the cache keys of earlier responses to similar queries.
+
+    The vectors are kept in memory in a preallocated matrix that doubles when full and are
+    searched brute force. The index is persisted next to the JSON cache so it survives
+    restarts; saves happen in a background thread after save_every new entries or
+    save_interval seconds, never on the request path.
+    """
+
+    def __init__(self, embedder, threshold: float = 0.92, index_file: Optional[str] = INDEX_FILE,
+                 save_every: int = 50, save_interval: float = 30.0):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.index_file = index_file
+        self.save_every = save_every
+        self.save_interval = save_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock() # One writer of the index file at a time, so an older snapshot never overwrites a newer one
+        self._vectors = None # Rows beyond _count are unused capacity
+        self._count = 0
+        self._keys = []
+        self._unsaved = 0
+        self._recent_vectors = OrderedDict() # Normalized query -> vector embedded by lookup, reused by add
+        self._load()
+        self._save_requested = threading.Event()
+        if self.index_file:
+            threading.Thread(target=self._save_loop, daemon=True).start()
+            atexit.register(self.flush)
+
+    def _embed(self, query: str) -> np.ndarray:
+        vector = self.embedder.embed([normalize_query(query)])[0]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, query: str) -> Optional[str]:
+        """Returns the cache key of the most similar earlier query, if it is similar enough."""
+        vector = self._embed(query)
+        with self._lock:
+            self._recent_vectors[normalize_query(query)] = vector
+            while len(self._recent_vectors) > RECENT_VECTORS:
+                self._recent_vectors.popitem(last=False)
+            if not self._count:
+                self.misses += 1
+                return None
+            similarities = self._vectors[:self._count] @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                self.hits += 1
+                print(f"Semantic cache hit ({similarities[best]:.3f}) for query: {query}")
+                return self._keys[best]
+            self.misses += 1
+            return None
+
+    def add(self, query: str, cache_key: str):
+        """Remembers that the response for query is cached under cache_key."""
+        with self._lock:
+            vector = self._recent_vectors.pop(normalize_query(query), None)
+        if vector is None: # Not looked up first, e.g. added from a batch response
+            vector = self._embed(query)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.empty((INITIAL_CAPACITY, len(vector)), dtype=np.float32)
+            elif self._count == len(self._vectors):
+                grown = np.empty((2 * len(self._vectors), self._vectors.shape[1]), dtype=np.float32)
+                grown[:self._count] = self._vectors[:self._count]
+                self._vectors = grown
+            self._vectors[self._count] = vector
+            self._count += 1
+            self._keys.append(cache_key)
+            self._unsaved += 1
+            if self._unsaved >= self.save_every:
+                self._save_requested.set()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def flush(self):
+        """Writes the entries added since the last save to the index file."""
+        with self._save_lock:
+            with self._lock:
+                if not self._unsaved or not self.index_file:
+                    return
+                vectors = self._vectors[:self._count].copy()
+                keys = list(self._keys)
+                self._unsaved = 0
+            self._save(vectors, keys)
+
+    def _save_loop(self):
+        while True:
+            self._save_requested.wait(self.save_interval)
+            self._save_requested.clear()
+            self.flush()
+
+    def _load(self):
+        if not self.index_file or not os.path.exists(self.index_file):
+            return
+        try:
+            with np.load(self.index_file) as index:
+                if str(index["embedder"]) != self.embedder.name:
+                    print(f"Semantic index {self.index_file} was built with another embedder. Starting a new index.")
+                    return
+                vectors = index["vectors"]
+                self._keys = index["keys"].tolist()
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Error reading semantic index {self.index_file}: {e}")
+            return
+        self._count = len(vectors)
+        self._vectors = np.empty((max(INITIAL_CAPACITY, 2 * self._count), vectors.shape[1]), dtype=np.float32)
+        self._vectors[:self._count] = vectors
+
+    def _save(self, vectors: np.ndarray, keys: List[str]):
+        # Write to a temporary file first so a crash never leaves a truncated index behind
+        tmp_file = self.index_file + ".tmp.npz"
+        try:
+            np.savez(tmp_file, vectors=vectors, keys=np.array(keys), embedder=np.array(self.embedder.name))
+            os.replace(tmp_file, self.index_file)
+        except OSError as e:
+            print(f"Error writing semantic index {self.index_file}: {e}")
+
+def create_semantic_cache(semantic_config: dict) -> SemanticCache:
+    """
+    Creates the semantic cache described by the "semantic_cache" section of config.json.
+    The "auto" embedder is the local hashing embedder for the stub and ollama backends, which
+    have no OpenAI key, and the OpenAI embeddings API otherwise.
+    """
+    embedder_name = semantic_config.get("embedder", "auto")
+    if embedder_name == "auto":
+        from llm import get_llm_backend
+        embedder_name = "hashing" if get_llm_backend() in ("stub", "ollama") else "openai"
+    if embedder_name == "hashing":
+        embedder = HashingEmbedder()
+    else:
+        embedder = OpenAIEmbedder(semantic_config.get("embedding_model", "text-embedding-3-small"))
+    return SemanticCache(embedder, threshold=semantic_config.get("threshold", 0.92),
+                         save_every=semantic_config.get("save_every", 50),
+                         save_interval=semantic_config.get("save_interval", 30.0))
@@ -1,4 +1,8 @@
 import streamlit as st
+from collections import OrderedDict
+
+# Number of rendered card lists kept per session for instant Back/Forward navigation
+MAX_CARD_SNAPSHOTS = 20
 
 def init_session_state():
     """Initializes the Streamlit session state for the card explorer."""
@@ -7,3 +11,30 @@ def init_session_state():
     if 'cards' not in st.session_state:
         # Structure: List of Card Pydantic objects (or dicts)
         st.session_state.cards = []
+    if 'query_history' not in st.session_state:
+        st.session_state.query_history = []
+    if 'history_index' not in st.session_state:
+        # Position of the current query in query_history, -1 while the history is empty
+        st.session_state.history_index = -1
+    if 'card_snapshots' not in st.session_state:
+        # Structure: query -> the (frozen, shared) card list rendered for it, least recently used first
+        st.session_state.card_snapshots = OrderedDict()
+    if 'prefetched_card_sets' not in st.session_state:
+        # Card sets whose "Related" results were already prefetched, so reruns do not request them again
+        st.session_state.prefetched_card_sets = set()
+
+def save_card_snapshot(query, cards):
+    """Keeps a reference to the cards rendered for query, evicting the least recently used snapshot."""
+    snapshots = st.session_state.card_snapshots
+    snapshots[query] = cards
+    snapshots.move_to_end(query)
+    while len(snapshots) > MAX_CARD_SNAPSHOTS:
+        snapshots.popitem(last=False)
+
+def get_card_snapshot(query):
+    """Returns the cards rendered earlier for query, or None if there is no snapshot."""
+    snapshots = st.session_state.card_snapshots
+    cards = snapshots.get(query)
+    if cards is not None:
+        snapshots.move_to_end(query)
+    return cards
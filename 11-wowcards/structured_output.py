@@ -0,0 +1,102 @@
+import copy
+from typing import Type, Optional, get_args, get_origin
+from pydantic import BaseModel, ValidationError
+
+# Keywords that OpenAI's strict structured outputs do not accept; they are moved into the
+# description instead, so the model still sees them, and enforced when the response is validated
+UNSUPPORTED_KEYWORDS = ("minLength", "maxLength", "minItems", "maxItems", "minimum", "maximum", "pattern", "format")
+DROPPED_KEYWORDS = ("title", "default", "examples")
+
+_strict_schemas = {}
+
+def strict_json_schema(schema: Type[BaseModel]) -> Optional[dict]:
+    """
+    Returns the JSON schema of a Pydantic model in the form strict structured outputs require:
+    every object closed (additionalProperties false) with all of its properties required.
+    Returns None if the model cannot be expressed that way, e.g. it has a Dict field with free-form keys.
+    """
+    if schema not in _strict_schemas:
+        try:
+            _strict_schemas[schema] = _make_strict(copy.deepcopy(schema.model_json_schema()))
+        except ValueError as e:
+            print(f"No strict JSON schema for {schema.__name__}: {e}")
+            _strict_schemas[schema] = None
+    return _strict_schemas[schema]
+
+def _make_strict(node):
+    if isinstance(node, list):
+        return [_make_strict(item) for item in node]
+    if not isinstance(node, dict):
+        return node
+
+    hints = [f"{keyword}: {node.pop(keyword)}" for keyword in UNSUPPORTED_KEYWORDS if keyword in node]
+    for keyword in DROPPED_KEYWORDS:
+        node.pop(keyword, None)
+    if hints:
+        description = node.get("description", "")
+        node["description"] = f"{description} ({', '.join(hints)})".strip()
+
+    if node.get("type") == "object":
+        if isinstance(node.get("additionalProperties"), dict) or "properties" not in node:
+            raise ValueError("objects with free-form keys are not supported")
+        node["additionalProperties"] = False
+        node["required"] = list(node["properties"])
+
+    for key, value in node.items():
+        if key == "properties":
+            node[key] = {name: _make_strict(prop) for name, prop in value.items()}
+        elif isinstance(value, (dict, list)):
+            node[key] = _make_strict(value)
+    return node
+
+def response_format_for(schema: Type[BaseModel]) -> dict:
+    """The response_format for a request: a strict JSON schema when the model allows one, JSON mode otherwise."""
+    json_schema = strict_json_schema(schema)
+    if json_schema is None:
+        return {"type": "json_object"}
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": schema.__name__, "schema": json_schema, "strict": True},
+    }
+
+def format_validation_errors(error: ValidationError, limit: int = 10) -> str:
+    """One line per validation error, with the location of the invalid value, for a repair prompt."""
+    lines = []
+    for detail in error.errors()[:limit]:
+        location = ".".join(str(part) for part in detail["loc"]) or "(root)"
+        lines.append(f"- {location}: {detail['msg']}")
+    if error.error_count() > limit:
+        lines.append(f"- ... and {error.error_count() - limit} more")
+    return "\n".join(lines)
+
+def salvage(schema: Type[BaseModel], data) -> Optional[BaseModel]:
+    """
+    Returns the valid part of a response: items of top-level lists (or tuples) of models that fail
+    validation are dropped. Returns None if what is left still does not match the schema.
+    """
+    if not isinstance(data, dict):
+        return None
+    data = dict(data)
+    dropped = 0
+    for name, field in schema.model_fields.items():
+        args = get_args(field.annotation)
+        if get_origin(field.annotation) not in (list, tuple) or not args or not isinstance(data.get(name), list):
+            continue
+        item_schema = args[0]
+        if not (isinstance(item_schema, type) and issubclass(item_schema, BaseModel)):
+            continue
+        valid_items = []
+        for item in data[name]:
+            try:
+                valid_items.append(item_schema.model_validate(item))
+            except ValidationError:
+                dropped += 1
+        data[name] = valid_items
+    if not dropped:
+        return None # Nothing to drop, so the response is as invalid as before
+    try:
+        salvaged = schema.model_validate(data)
+    except ValidationError:
+        return None
+    print(f"Salvaged a partially valid {schema.__name__} response by dropping {dropped} invalid items")
+    return salvaged
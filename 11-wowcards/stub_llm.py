@@ -0,0 +1,90 @@
+import json
+import re
+import time
+import random
+from hashlib import sha256
+from types import SimpleNamespace
+from typing import Callable, Optional
+from json_cache import get_json_cache, unwrap_cache_data
+
+class StubLLMClient:
+    """
+    Deterministic in-process stand-in for openai.OpenAI (the "stub" LLM backend).
+
+    Chat completions are answered by replaying the cached response for the same prompt
+    from fixtures_dir when there is one, and otherwise with fake cards or Markdown derived
+    from the prompt. Every request waits latency seconds plus up to latency_jitter seconds,
+    where the jitter is derived from the prompt so reruns behave identically. This lets the
+    app, its cache and the tools around it run and be benchmarked without network access.
+    """
+
+    def __init__(self, latency: float = 0.0, latency_jitter: float = 0.0, fixtures_dir: Optional[str] = None,
+                 fixture_key: Optional[Callable[[list], str]] = None):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.fixtures_dir = fixtures_dir
+        self.fixture_key = fixture_key # Maps the request messages to the cache key of the fixture
+        self.requests = 0
+        self.replayed = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_completion))
+
+    def _create_completion(self, model, messages, stream=False, **kwargs):
+        self.requests += 1
+        prompt = messages[-1]["content"]
+        delay = self.latency
+        if self.latency_jitter:
+            delay += random.Random(prompt).uniform(0, self.latency_jitter)
+        if delay:
+            time.sleep(delay)
+
+        data = self._replay(messages)
+        if data is None:
+            data = _fake_response("\n".join(message["content"] for message in messages))
+        else:
+            self.replayed += 1
+        content = json.dumps(data)
+        usage = SimpleNamespace(prompt_tokens=len(prompt) // 4, completion_tokens=len(content) // 4, prompt_tokens_details=None)
+        if stream:
+            return _stream_chunks(content, usage)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=usage,
+        )
+
+    def _replay(self, messages):
+        if not self.fixtures_dir or not self.fixture_key:
+            return None
+        cache = get_json_cache(self.fixture_key(messages), cache_dir=self.fixtures_dir)
+        return unwrap_cache_data(cache) if cache is not None else None
+
+def _fake_cards(topic: str) -> dict:
+    digest = sha256(topic.encode('utf-8')).hexdigest()
+    return {
+        "cards": [
+            {
+                "title": f"Angle {digest[i * 4:i * 4 + 4]} on {topic[:40]}",
+                "content": f"A generated card about {topic[:200]}. It is deterministic stub content number {i + 1}.",
+            }
+            for i in range(4)
+        ]
+    }
+
+def _fake_response(prompt: str) -> dict:
+    """Fake response for the request text (the system and user messages joined)."""
+    if "markdown_content" in prompt:
+        title = re.search(r'Title: "(.*)"', prompt)
+        title = title.group(1) if title else "Topic"
+        return {"markdown_content": f"# {title}\n\nStub expansion of the topic.\n\n- Detail one\n- Detail two\n"}
+
+    topics = re.search(r"## Topics:\s*(\[.*?\])\s*(?:\n\n|$)", prompt, re.DOTALL)
+    if topics:
+        return {"topics": {topic: _fake_cards(topic) for topic in json.loads(topics.group(1))}}
+
+    topic = re.search(r'user\'s input topic: "(.*)"', prompt)
+    return _fake_cards(topic.group(1) if topic else prompt)
+
+def _stream_chunks(content: str, usage, chunk_size: int = 16):
+    for i in range(0, len(content), chunk_size):
+        delta = SimpleNamespace(content=content[i:i + chunk_size])
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+    yield SimpleNamespace(choices=[], usage=usage)
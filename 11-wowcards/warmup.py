@@ -0,0 +1,166 @@
+"""
+Fills query_cache/ ahead of time so the first users of a new deployment get cached cards.
+
+Starting from a topic list or seed topics, it generates the cards for every topic and
+follows their "Related" queries breadth first, optionally expanding every card as the
+"Dig deeper" drawer would. Run it from the wowcards directory:
+
+    python warmup.py --seed "10 random cards" --depth 2 --expand
+    python warmup.py --topics topics.txt --concurrency 8 --rate 4
+    python warmup.py --seed "Space travel" --backend stub   # offline, no API key needed
+"""
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from llm import get_llm_client, set_llm_client, LLM_BACKENDS
+from card_query import generate_cards, expand_topic_details, related_query
+from metrics import metrics, HIT
+from json_cache import CACHE_DIR
+
+class RateLimiter:
+    """Allows at most `rate` acquisitions per second across all threads."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self.next_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+def rate_limited(client, limiter: RateLimiter):
+    """Wraps an OpenAI(-like) client so every chat completion request waits for the limiter; cache hits are not limited."""
+    def create(*args, **kwargs):
+        limiter.acquire()
+        return client.chat.completions.create(*args, **kwargs)
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)), embeddings=getattr(client, "embeddings", None))
+
+def load_checkpoint(path: str):
+    if path and os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return None
+
+def save_checkpoint(path: str, state: dict):
+    if not path:
+        return
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path) # Atomic, so an interrupted run never leaves a broken checkpoint
+
+def warm_topic(topic: str, expand: bool) -> dict:
+    """Generates (or finds cached) cards for topic and optionally their expansions."""
+    card_list = generate_cards(topic)
+    if not card_list or not card_list.cards:
+        return {"topic": topic, "ok": False, "related": [], "expanded": 0}
+    expanded = 0
+    if expand:
+        for card in card_list.cards:
+            if expand_topic_details(card.title, card.content):
+                expanded += 1
+    return {
+        "topic": topic,
+        "ok": True,
+        "related": [related_query(card) for card in card_list.cards],
+        "expanded": expanded,
+    }
+
+def run_warmup(frontier, max_depth: int, max_topics: int, concurrency: int, expand: bool,
+               checkpoint_path: str = None, state: dict = None) -> dict:
+    """
+    Processes the frontier breadth first, one depth level at a time.
+    frontier is a list of [topic, depth] pairs; the state is checkpointed after every level.
+    """
+    state = state or {"done": [], "failed": [], "frontier": frontier, "cards": 0, "expanded": 0}
+    done = set(state["done"]) | set(state["failed"])
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while state["frontier"] and len(state["done"]) < max_topics:
+            level = []
+            remaining = [] # Queued topics that did not fit in max_topics stay in the checkpoint
+            for topic, depth in state["frontier"]:
+                if topic in done:
+                    continue
+                if len(state["done"]) + len(level) < max_topics:
+                    done.add(topic)
+                    level.append((topic, depth))
+                else:
+                    remaining.append([topic, depth])
+            next_frontier = []
+            for (topic, depth), result in zip(level, executor.map(lambda item: warm_topic(item[0], expand), level)):
+                if not result["ok"]:
+                    state["failed"].append(topic)
+                    continue
+                state["done"].append(topic)
+                state["cards"] += len(result["related"])
+                state["expanded"] += result["expanded"]
+                if depth < max_depth:
+                    next_frontier.extend([related, depth + 1] for related in result["related"] if related not in done)
+            state["frontier"] = remaining + next_frontier
+            save_checkpoint(checkpoint_path, state)
+            print(f"Level done: {len(state['done'])} topics cached, {len(state['failed'])} failed, {len(state['frontier'])} queued")
+    return state
+
+def print_report(state: dict, elapsed: float):
+    rows = metrics.summary()
+    calls = sum(row["calls"] for row in rows)
+    hits = sum(row["calls"] for row in rows if row["outcome"] == HIT)
+    attempted = len(state["done"]) + len(state["failed"])
+    print("\nWarmup report")
+    print(f"  Topics cached:        {len(state['done'])} of {attempted} attempted ({len(state['done']) / attempted if attempted else 0:.0%} coverage)")
+    print(f"  Topics still queued:  {len(state['frontier'])}")
+    print(f"  Cards cached:         {state['cards']}")
+    print(f"  Expansions cached:    {state['expanded']}")
+    print(f"  LLM calls:            {calls} ({hits} already cached, {calls - hits} fetched)")
+    print(f"  Elapsed:              {elapsed:.1f}s")
+    if state["failed"]:
+        print(f"  Failed topics:        {', '.join(state['failed'][:10])}{' ...' if len(state['failed']) > 10 else ''}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm up the wowcards query cache.")
+    parser.add_argument("--topics", type=str, help="File with one topic per line.")
+    parser.add_argument("--seed", type=str, action="append", default=[], help="Seed topic to crawl from (can be repeated).")
+    parser.add_argument("--depth", type=int, default=1, help="How many levels of Related queries to follow (default: 1).")
+    parser.add_argument("--max_topics", type=int, default=200, help="Stop after this many topics (default: 200).")
+    parser.add_argument("--concurrency", type=int, default=4, help="Topics processed in parallel (default: 4).")
+    parser.add_argument("--rate", type=float, default=2.0, help="Maximum LLM requests per second (default: 2).")
+    parser.add_argument("--expand", action="store_true", help="Also cache the Dig deeper expansion of every card.")
+    parser.add_argument("--checkpoint", type=str, default="warmup_checkpoint.json", help="Checkpoint file used to resume an interrupted run (delete it to start over).")
+    parser.add_argument("--backend", type=str, choices=LLM_BACKENDS, help="LLM backend to use instead of llm_backend in config.json; 'stub' runs offline.")
+    args = parser.parse_args()
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    if args.backend:
+        os.environ["WOWCARDS_LLM_BACKEND"] = args.backend
+    set_llm_client(rate_limited(get_llm_client(), RateLimiter(args.rate)))
+
+    state = load_checkpoint(args.checkpoint)
+    if state:
+        print(f"Resuming from {args.checkpoint}: {len(state['done'])} topics done, {len(state['frontier'])} queued")
+    else:
+        topics = list(args.seed)
+        if args.topics:
+            with open(args.topics, 'r') as f:
+                topics.extend(line.strip() for line in f if line.strip())
+        if not topics:
+            parser.error("Give at least one --seed or a --topics file.")
+        state = {"done": [], "failed": [], "frontier": [[topic, 0] for topic in topics], "cards": 0, "expanded": 0}
+
+    start_time = time.perf_counter()
+    state = run_warmup(state["frontier"], args.depth, args.max_topics, args.concurrency, args.expand,
+                       checkpoint_path=args.checkpoint, state=state)
+    print_report(state, time.perf_counter() - start_time)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import os
+import json
+from dataclasses import dataclass, field
+import numpy as np
+
+# Liking scores run from 1 (dislike) to 5 (like); NaN means not reported
+MIN_LIKING = 1
+MAX_LIKING = 5
+
+@dataclass
+class AgentReply:
+    situation: str
+    action: str
+    emotions: list
+    liking: dict # other agent -> score
+    addresses: list = field(default_factory=list) # agents the reply is directed at
+
+def reply_response_format(others):
+    """Strict JSON schema for an agent's reply, with a liking score for each of the other agents."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "agent_reply",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "situation": {"type": "string", "description": "Hvordan ser du situationen (10-20 ord)"},
+                    "action": {"type": "string", "description": "Hvad vil du gøre, om noget (1-5 ord)"},
+                    "emotions": {"type": "array", "items": {"type": "string"}, "description": "Dine følelser (1-3 ord)"},
+                    "addresses": {"type": "array", "items": {"type": "string"}, "description": "Navnene på dem du henvender dig til, hvis nogen"},
+                    "liking": {
+                        "type": "object",
+                        "properties": {other: {"type": "integer", "description": f"{MIN_LIKING}-{MAX_LIKING}"} for other in others},
+                        "required": list(others),
+                        "additionalProperties": False,
+                    },
+                },
+                "required": ["situation", "action", "emotions", "addresses", "liking"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+def _string_list(value):
+    """A list of strings from a reply field that should be one, but may be a single string or missing."""
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list):
+        return [str(item) for item in value]
+    return []
+
+def parse_reply(text, others):
+    """
+    Parses a JSON reply; scores outside the scale are clipped and missing or malformed fields left out.
+    Raises ValueError (json.JSONDecodeError included) if the reply is not a JSON object.
+    """
+    data = json.loads(text)
+    if not isinstance(data, dict):
+        raise ValueError(f"expected a JSON object, got {type(data).__name__}")
+    scores = data.get("liking")
+    liking = {}
+    for other in others:
+        score = scores.get(other) if isinstance(scores, dict) else None
+        if isinstance(score, (int, float)) and not isinstance(score, bool):
+            liking[other] = min(MAX_LIKING, max(MIN_LIKING, score))
+    return AgentReply(
+        situation=str(data.get("situation", "")),
+        action=str(data.get("action", "")),
+        emotions=_string_list(data.get("emotions")),
+        liking=liking,
+        addresses=_string_list(data.get("addresses")),
+    )
+
+def format_reply(reply):
+    """The reply as text for the conversation the other agents see; it starts with the situation, which heuristic_summary keeps."""
+    liking = "\n".join(f"  [{other}]: {score}" for other, score in reply.liking.items())
+    addresses = f"Til: {', '.join(reply.addresses)}\n" if reply.addresses else ""
+    return f"Situation: {reply.situation}\n{addresses}Handling: {reply.action}\nFølelse: {', '.join(reply.emotions)}\n{liking}"
+
+@dataclass
+class RoundState:
+    round: int
+    actions: dict = field(default_factory=dict) # agent -> action
+    emotions: dict = field(default_factory=dict) # agent -> list of emotions
+    liking: np.ndarray = None # liking[i, j]: how much agent i likes agent j
+
+class StateStore:
+    """
+    Time series of the per-round agent state, saved as one compressed .npz file:
+    liking is a (rounds, agents, agents) float32 array, actions and emotions are
+    (rounds, agents) string arrays. Load it with np.load(path) for analysis and plots.
+
+    The file is rewritten every save_every rounds and by flush() at the end of a run,
+    not after every round.
+    """
+
+    def __init__(self, agents, path=None, save_every=10):
+        self.agents = list(agents)
+        self.index = {agent: i for i, agent in enumerate(self.agents)}
+        self.path = path
+        self.save_every = save_every
+        self.rounds = []
+        self.saved_rounds = 0
+
+    def new_round(self, round):
+        n = len(self.agents)
+        return RoundState(round=round, liking=np.full((n, n), np.nan, dtype=np.float32))
+
+    def record(self, state, agent, reply):
+        state.actions[agent] = reply.action
+        state.emotions[agent] = reply.emotions
+        for other, score in reply.liking.items():
+            if other in self.index:
+                state.liking[self.index[agent], self.index[other]] = score
+
+    def add_round(self, state):
+        self.rounds.append(state)
+        if len(self.rounds) - self.saved_rounds >= self.save_every:
+            self.flush()
+
+    def flush(self):
+        """Saves the rounds added since the last save to path."""
+        if self.path and len(self.rounds) > self.saved_rounds:
+            self.save(self.path)
+            self.saved_rounds = len(self.rounds)
+
+    def arrays(self):
+        return {
+            "agents": np.array(self.agents),
+            "round": np.array([state.round for state in self.rounds], dtype=np.int32),
+            "liking": np.stack([state.liking for state in self.rounds]) if self.rounds else np.empty((0, len(self.agents), len(self.agents)), dtype=np.float32),
+            "actions": np.array([[state.actions.get(agent, "") for agent in self.agents] for state in self.rounds], dtype=str).reshape(len(self.rounds), len(self.agents)),
+            "emotions": np.array([[", ".join(state.emotions.get(agent, [])) for agent in self.agents] for state in self.rounds], dtype=str).reshape(len(self.rounds), len(self.agents)),
+        }
+
+    def save(self, path):
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(tmp_path, **self.arrays())
+        os.replace(tmp_path, path) # Atomic, so a crash mid-run never leaves a broken file
@@ -1,10 +1,44 @@
 import openai
 import time
+import asyncio
+import argparse
+import threading
+from dataclasses import dataclass, field
 from colorama import Fore, Style
+from conversation import ConversationContext, heuristic_summary, count_tokens
+from agent_state import StateStore, reply_response_format, parse_reply, format_reply
+from response_cache import ResponseCache, CACHE_MODES
+from scheduler import SpeakerScheduler, generate_personas, POLICIES
 
-# Initialize the OpenAI client
-# The client will automatically pick up the OPENAI_API_KEY from the environment variables
-client = openai.OpenAI()
+# The OpenAI clients will automatically pick up the OPENAI_API_KEY from the environment variables.
+# They are created on first use, so runs replayed from a ResponseCache need no key
+client = None
+async_clients = {} # event loop -> AsyncOpenAI, as its pooled connections belong to the loop they were opened in
+
+def get_client():
+    global client
+    if client is None:
+        client = openai.OpenAI()
+    return client
+
+def get_async_client():
+    """The async client of the running event loop."""
+    loop = asyncio.get_running_loop()
+    if loop not in async_clients:
+        async_clients[loop] = openai.AsyncOpenAI()
+    return async_clients[loop]
+
+async def close_async_client():
+    """Closes the running event loop's async client, if it has one, before the loop is closed."""
+    async_client = async_clients.pop(asyncio.get_running_loop(), None)
+    if async_client is not None:
+        await async_client.close()
+
+MODEL = "gpt-4.1-mini"
+TEMPERATURE = 0.7
+
+# Set to a ResponseCache (response_cache.py) to record responses and replay them for identical requests
+response_cache = None
 
 # === 1. Definer personaer ===
 
@@ -38,21 +72,33 @@ Der er folk på teamet som er frusteret omkring kvalitet og struktur i software
 
 """
 
-def format_other_agents(other_agents):
-    return "\n".join([f"[{a}]: {PERSONAS[a]['personality']}, {PERSONAS[a]['goals']}, {PERSONAS[a]['role']}" for a in other_agents])
+LEADER_PROMPT = "Hvad skal vi gøre i denne situation?"
 
-def build_prompt(agent_name, conversation):
-    persona = PERSONAS[agent_name]
-    other_agents = [a for a in PERSONAS if a != agent_name]
+@dataclass
+class Scenario:
+    """One simulation setup: who takes part, the situation, what the leader opens with, and the sampling seed."""
+    personas: dict = field(default_factory=lambda: PERSONAS)
+    situation: str = SITUATION
+    leader_prompt: str = LEADER_PROMPT
+    turn_order: list = field(default_factory=lambda: ["K", "C", "N"])
+    seed: int = None
+
+def format_other_agents(other_agents, personas=PERSONAS):
+    return "\n".join([f"[{a}]: {personas[a]['personality']}, {personas[a]['goals']}, {personas[a]['role']}" for a in other_agents])
+
+def build_prompt(agent_name, conversation, personas=PERSONAS, situation=SITUATION, other_agents=None):
+    persona = personas[agent_name]
+    if other_agents is None:
+        other_agents = [a for a in personas if a != agent_name]
     prompt = f"""
 Du er {agent_name}, en {persona['role']}.
 Din personlighed: {persona['personality']}
 Dine mål: {persona['goals']}
 
-Aktuel situation: {SITUATION}
+Aktuel situation: {situation}
 
 # Her er de andre personer du skal relatere dig til:
-{format_other_agents(other_agents)}
+{format_other_agents(other_agents, personas)}
 
 # Hvad er der sket tidligere?
 {conversation}
@@ -61,54 +107,249 @@ Aktuel situation: {SITUATION}
 Situation: Hvordan ser du situationen (10-20 ord)?
 Handling: Hvad vil du gøre, om noget (1-5 ord)?
 Følelse: Hvilke følelser har du (1-3 ord)?
+Henvendelse: Hvem henvender du dig til, hvis nogen?
 For hver person i gruppen:
   [navn]: Hvor godt kan jeg lide denne person på en skala fra 1-5
 
-# Eksempel på formattering:
-Situation: "beskrivelse af situation"
-Handling: "beskrivelse af hvad du vil gøre"
-Følelse: "beskrivelse af hvilke følelser du har"
-  [A]: 3
-  [B]: 1
-  [C]: 2
+# Svar som JSON:
+{{"situation": "...", "action": "...", "emotions": ["..."], "addresses": ["[navn]"], "liking": {{"[navn]": 1-5}}}}
 
 # Eksempel på output:
-Situation: jeg er træt af at have en teknisk leder, som ikke giver mig tid til at kode.
-Handling: snakke med A om at han skal give mig tid til at kode.
-Følelse: stres, træt, frustreret
-    [B]: "på god fod, hun er en god kollega"
-    [C]: "synes bare hun skal teste mere"
+{{"situation": "jeg er træt af at have en teknisk leder, som ikke giver mig tid til at kode.", "action": "snakke med A om tid til at kode", "emotions": ["stres", "træt", "frustreret"], "addresses": ["A"], "liking": {{"A": 2, "B": 4, "C": 3}}}}
 
 """
     return prompt
 
-def gpt_response(prompt):
-    response = client.chat.completions.create(
-        model="gpt-4.1-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.7,
-    )
-    return response.choices[0].message.content.strip()
-
-def simulate_conversation():
-    conversation = ""
-    turn_order = ["LEDER", "K", "C", "N"]
-    print("Start simulation. Du er LEDER. Skriv første besked til K.")
+# === 3. Rate limiting ===
+
+class TokenBucket:
+    """Allows bursts of up to `capacity` LLM calls and `rate` calls per second on average, across threads and tasks."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Takes a token and returns how many seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def wait(self):
+        time.sleep(self._reserve())
+
+    async def acquire(self):
+        await asyncio.sleep(self._reserve())
+
+def chat_request(prompt, response_format=None, seed=None):
+    request = {
+        "model": MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": TEMPERATURE,
+    }
+    if response_format:
+        request["response_format"] = response_format
+    if seed is not None:
+        request["seed"] = seed # Best effort reproducibility, and a separate cache entry per seed
+    return request
+
+def gpt_response(prompt, response_format=None, seed=None, bucket=None):
+    request = chat_request(prompt, response_format, seed)
+    reply = response_cache.get(request) if response_cache else None
+    if reply is not None:
+        return reply
+    if bucket:
+        bucket.wait()
+    response = get_client().chat.completions.create(**request)
+    reply = response.choices[0].message.content.strip()
+    if response_cache:
+        response_cache.put(request, reply)
+    return reply
+
+async def gpt_response_async(prompt, response_format=None, seed=None, bucket=None):
+    request = chat_request(prompt, response_format, seed)
+    reply = response_cache.get(request) if response_cache else None
+    if reply is not None:
+        return reply
+    if bucket:
+        await bucket.acquire()
+    response = await get_async_client().chat.completions.create(**request)
+    reply = response.choices[0].message.content.strip()
+    if response_cache:
+        response_cache.put(request, reply)
+    return reply
+
+# === 4. Samtalens kontekst ===
+
+def llm_summary(summary, turns, max_tokens, bucket=None):
+    """Rolling summary written by the LLM, used for turns that no longer fit in the prompt verbatim."""
+    new_turns = "".join(f"{speaker}: {text}\n" for speaker, text in turns)
+    prompt = f"""
+Du vedligeholder et resumé af en samtale i et softwareteam.
+
+# Resumé indtil nu:
+{summary or "(tomt)"}
+
+# Nye replikker:
+{new_turns}
+
+Skriv et opdateret resumé på højst {max_tokens * 3 // 4} ord. Bevar hvem der mener hvad, aftaler, konflikter og følelser. Skriv kun resuméet.
+"""
+    return gpt_response(prompt, bucket=bucket)
+
+# === 5. Simulation ===
+
+def print_turn(agent, prompt, reply):
+    print(f"{Fore.RED}\n\n{agent} ##########################################{Style.RESET_ALL}")
+    print(f"{Fore.GREEN}{prompt}{Style.RESET_ALL}")
+    print(f"{Fore.BLUE}Agent: {agent}{Style.RESET_ALL}")
+    print(f"{Fore.BLUE}{reply}{Style.RESET_ALL}")
+
+def other_agents(agent, personas=PERSONAS):
+    return [a for a in personas if a != agent]
+
+def agent_request(agent, scenario, context, scheduler=None):
+    """The prompt for agent and the other agents it relates to; with a scheduler only the relevant ones."""
+    if scheduler is None:
+        others = other_agents(agent, scenario.personas)
+        return build_prompt(agent, context.render(), scenario.personas, scenario.situation), others
+    others = scheduler.relevant(agent)
+    visible = set(others) | {agent, "LEDER"}
+    conversation = context.render(lambda speaker, text: speaker in visible or scheduler.mentions_agent(agent, text))
+    return build_prompt(agent, conversation, scenario.personas, scenario.situation, others), others
+
+def record_reply(agent, prompt, reply, others, context, store, state, scheduler=None):
+    """Parses a structured reply into the round state and adds it to the conversation."""
+    print_turn(agent, prompt, reply)
+    try:
+        parsed = parse_reply(reply, others)
+    except ValueError as e: # Not JSON, or not a JSON object
+        print(f"{Fore.RED}Kunne ikke læse svaret fra {agent}: {e}{Style.RESET_ALL}")
+        context.add(agent, reply)
+        if scheduler:
+            scheduler.observe(agent, reply)
+        return
+    store.record(state, agent, parsed)
+    context.add(agent, format_reply(parsed))
+    if scheduler:
+        scheduler.observe(agent, f"{parsed.situation} {parsed.action}", parsed.addresses)
+
+def run_round_sequential(scenario, speakers, context, bucket, store, state, scheduler=None):
+    """Agents take turns; each one sees the replies of the agents before it in this round."""
+    for agent in speakers:
+        prompt, others = agent_request(agent, scenario, context, scheduler)
+        reply = gpt_response(prompt, reply_response_format(others), scenario.seed, bucket)
+        record_reply(agent, prompt, reply, others, context, store, state, scheduler)
+    return context
+
+async def run_round_parallel(scenario, speakers, context, bucket, store, state, scheduler=None):
+    """All agents react to the same conversation snapshot at once; replies are added in turn order."""
+    requests = [agent_request(agent, scenario, context, scheduler) for agent in speakers]
+    replies = await asyncio.gather(*[
+        gpt_response_async(prompt, reply_response_format(others), scenario.seed, bucket)
+        for prompt, others in requests
+    ])
+    for agent, (prompt, others), reply in zip(speakers, requests, replies):
+        record_reply(agent, prompt, reply, others, context, store, state, scheduler)
+    return context
+
+def reserved_prompt_tokens(scenario, scheduler=None):
+    """Tokens of the largest prompt without the conversation; with a scheduler agents see max_relevant others."""
+    def others(agent):
+        agents = other_agents(agent, scenario.personas)
+        return agents[:scheduler.max_relevant] if scheduler else agents
+    return max(count_tokens(build_prompt(agent, "", scenario.personas, scenario.situation, others(agent)))
+               for agent in scenario.turn_order)
+
+def simulate_conversation(rounds=1, mode="sequential", rate=1.0, burst=3, keep_turns=6, prompt_tokens=2500,
+                          summarizer="llm", state_file=None, scenario=None, bucket=None, scheduler=None):
+    scenario = scenario or Scenario()
+    bucket = bucket or TokenBucket(rate, capacity=burst)
+    if summarizer == "llm":
+        summarize = lambda summary, turns, max_tokens: llm_summary(summary, turns, max_tokens, bucket)
+    else:
+        summarize = heuristic_summary
+    context = ConversationContext(keep_turns, prompt_tokens, summarize, reserved_prompt_tokens(scenario, scheduler))
+    store = StateStore(scenario.personas, state_file)
+    print(f"Start simulation. Du er LEDER. Skriv første besked til {scenario.turn_order[0]}.")
     
     # user_input = input("LEDER: ")
-    user_input = "Hvad skal vi gøre i denne situation?"
-    conversation += f"LEDER: {user_input}\n"
+    user_input = scenario.leader_prompt
+    context.add("LEDER", user_input)
     print(f"LEDER: {user_input}")
+    if scheduler:
+        scheduler.observe("LEDER", user_input)
+        scheduler.end_round()
+
+    # Parallel rounds share one event loop and its async client, which is closed before the loop;
+    # sequential rounds use the blocking client and need no loop
+    runner = asyncio.Runner() if mode == "parallel" else None
+    try:
+        for round in range(rounds):
+            start_time = time.perf_counter()
+            state = store.new_round(round)
+            # Without a scheduler everyone in the turn order speaks every round
+            speakers = scheduler.choose() if scheduler else scenario.turn_order
+            if runner:
+                runner.run(run_round_parallel(scenario, speakers, context, bucket, store, state, scheduler))
+            else:
+                run_round_sequential(scenario, speakers, context, bucket, store, state, scheduler)
+            store.add_round(state)
+            if scheduler:
+                scheduler.end_round()
+            print(f"{Fore.YELLOW}Runde {round + 1} tog {time.perf_counter() - start_time:.1f}s ({mode}), "
+                  f"promptet er nu op til {context.reserved_tokens + context.tokens()} tokens{Style.RESET_ALL}")
+    finally:
+        store.flush() # Also keeps the finished rounds of a run that failed or was interrupted
+        if runner:
+            try:
+                runner.run(close_async_client())
+            finally:
+                runner.close()
+    return context, store
 
-    for round in range(1):
-        for agent in turn_order[1:]:
-            print(f"{Fore.RED}\n\n{agent} ##########################################{Style.RESET_ALL}")
-            prompt = build_prompt(agent, conversation)
-            print(f"{Fore.GREEN}{prompt}{Style.RESET_ALL}")
-            reply = gpt_response(prompt)
-            print(f"{Fore.BLUE}Agent: {agent}{Style.RESET_ALL}")
-            print(f"{Fore.BLUE}{reply}{Style.RESET_ALL}")
-            conversation += f"{agent}: {reply}\n"
-            time.sleep(1)
-
-simulate_conversation()
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simuler en samtale i et team.")
+    parser.add_argument("--rounds", type=int, default=1, help="Antal runder (default: 1).")
+    parser.add_argument("--mode", choices=["sequential", "parallel"], default="sequential",
+                        help="sequential: agenterne svarer efter tur. parallel: alle agenter i en runde svarer samtidig på samme samtale.")
+    parser.add_argument("--rate", type=float, default=1.0, help="Gennemsnitligt antal LLM-kald per sekund (default: 1).")
+    parser.add_argument("--burst", type=int, default=3, help="Antal LLM-kald der må sendes på én gang (default: 3).")
+    parser.add_argument("--keep_turns", type=int, default=6, help="Antal seneste replikker der vises ordret efter en opsummering (default: 6).")
+    parser.add_argument("--prompt_tokens", type=int, default=2500, help="Tokenbudget for hele promptet, inklusive samtalen (default: 2500).")
+    parser.add_argument("--summarizer", choices=["llm", "heuristic"], default="llm",
+                        help="Hvordan ældre replikker opsummeres: af LLM'en eller med første sætning af hver replik.")
+    parser.add_argument("--state_file", type=str, default="agent_state.npz",
+                        help="Fil med handlinger, følelser og hvor godt agenterne kan lide hinanden, runde for runde (default: agent_state.npz).")
+    parser.add_argument("--cache_mode", choices=("off",) + CACHE_MODES, default="off",
+                        help="record: gem alle LLM-svar. replay: brug kun gemte svar (ingen API-kald). "
+                             "record_on_miss: brug gemte svar og gem nye. off (default): altid nye svar.")
+    parser.add_argument("--cache_dir", type=str, default="response_cache", help="Mappe med gemte LLM-svar (default: response_cache).")
+    parser.add_argument("--team_size", type=int, help="Simuler et genereret team med dette antal personer i stedet for K, H, C og N.")
+    parser.add_argument("--scheduler", choices=POLICIES,
+                        help="Vælg hvem der taler hver runde: addressed (dem der blev talt til), salience eller random. "
+                             "Uden scheduler taler alle hver runde.")
+    parser.add_argument("--max_speakers", type=int, default=4, help="Antal der taler per runde med --scheduler (default: 4).")
+    parser.add_argument("--max_relevant", type=int, default=5, help="Antal andre personer hver agent ser med --scheduler (default: 5).")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed for LLM-kaldene, de genererede personer og valget af talere, så samme seed giver samme prompts "
+                             "og kan afspilles med --cache_mode replay (default: 0).")
+    args = parser.parse_args()
+    if args.cache_mode != "off":
+        response_cache = ResponseCache(args.cache_dir, args.cache_mode)
+    scenario = Scenario(seed=args.seed)
+    if args.team_size:
+        personas = generate_personas(args.team_size, seed=args.seed)
+        scenario = Scenario(personas=personas, turn_order=list(personas), seed=args.seed)
+    scheduler = None
+    if args.scheduler:
+        scheduler = SpeakerScheduler(scenario.turn_order, args.max_speakers, args.max_relevant, args.scheduler, seed=scenario.seed)
+    simulate_conversation(rounds=args.rounds, mode=args.mode, rate=args.rate, burst=args.burst,
+                          keep_turns=args.keep_turns, prompt_tokens=args.prompt_tokens, summarizer=args.summarizer,
+                          state_file=args.state_file, scenario=scenario, scheduler=scheduler)
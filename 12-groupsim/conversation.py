@@ -0,0 +1,87 @@
+try:
+    import tiktoken # Optional: exact token counts for the OpenAI models
+    _encoding = tiktoken.get_encoding("o200k_base")
+except ImportError:
+    _encoding = None
+
+# The conversation always gets at least this many tokens, even when the rest of the prompt takes up the whole budget
+MIN_CONVERSATION_TOKENS = 200
+
+def count_tokens(text):
+    if _encoding:
+        return len(_encoding.encode(text))
+    return len(text) // 4 # Rough estimate when tiktoken is not installed
+
+def truncate_tokens(text, max_tokens):
+    """Cuts text to at most max_tokens tokens, at the last line or sentence end if there is one."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    text = _encoding.decode(_encoding.encode(text)[:max_tokens]) if _encoding else text[:max_tokens * 4]
+    end = max(text.rfind("\n"), text.rfind(". "))
+    return text[:end + 1].rstrip() if end > 0 else text
+
+def heuristic_summary(summary, turns, max_tokens):
+    """Summarizes without an LLM: the first sentence of every turn, dropping the oldest lines when over max_tokens."""
+    lines = [line for line in summary.split("\n") if line]
+    for speaker, text in turns:
+        first_sentence = text.strip().split("\n")[0].split(". ")[0][:200]
+        lines.append(f"{speaker}: {first_sentence}")
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+class ConversationContext:
+    """
+    The conversation as it is shown to the agents: recent turns verbatim and a rolling summary of
+    everything before them, kept within token_budget tokens for the whole prompt, of which
+    reserved_tokens go to the rest of the prompt (persona, situation and questions).
+
+    Turns stay verbatim until the conversation exceeds its budget. Then everything but the last
+    keep_turns turns (fewer if they take more than a quarter of the budget) is folded into the
+    summary with one summarize(summary, turns, max_tokens) call, which returns the summary extended
+    with the given (speaker, text) turns. Every prompt thus costs about the same however long the
+    simulation runs, and the summary is only updated every few turns.
+    """
+
+    def __init__(self, keep_turns=6, token_budget=2500, summarize=heuristic_summary, reserved_tokens=0):
+        self.keep_turns = keep_turns
+        self.token_budget = token_budget
+        self.summarize = summarize
+        self.reserved_tokens = reserved_tokens
+        self.turns = []
+        self.summary = ""
+        self.summarized = 0 # Turns before this index are part of the summary
+
+    def conversation_budget(self):
+        return max(MIN_CONVERSATION_TOKENS, self.token_budget - self.reserved_tokens)
+
+    def add(self, speaker, text):
+        self.turns.append((speaker, text))
+        budget = self.conversation_budget()
+        if count_tokens(self.render()) <= budget:
+            return
+        fold_until = max(self.summarized, len(self.turns) - self.keep_turns)
+        # Leave the recent turns room to grow, so the next fold is some turns away
+        while fold_until < len(self.turns) - 1 and self._recent_tokens(fold_until) > budget // 4:
+            fold_until += 1
+        if fold_until > self.summarized:
+            summary = self.summarize(self.summary, self.turns[self.summarized:fold_until], budget // 2)
+            self.summary = truncate_tokens(summary, budget // 2)
+            self.summarized = fold_until
+
+    def _recent_tokens(self, start):
+        return count_tokens(self._format_turns(self.turns[start:]))
+
+    @staticmethod
+    def _format_turns(turns):
+        return "".join(f"{speaker}: {text}\n" for speaker, text in turns)
+
+    def render(self, include=None):
+        """The summary and the recent turns; include(speaker, text) can leave out recent turns that are not relevant."""
+        recent = self._format_turns(turn for turn in self.turns[self.summarized:] if include is None or include(*turn))
+        if not self.summary:
+            return recent
+        return f"Resumé af den tidligere samtale:\n{self.summary}\n\nSeneste replikker:\n{recent}"
+
+    def tokens(self):
+        return count_tokens(self.render())
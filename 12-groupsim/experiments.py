@@ -0,0 +1,130 @@
+"""
+Runs groupsim over a grid of persona sets, situations, leader prompts and seeds.
+
+The simulations run concurrently in threads under one global rate limit, every LLM response
+is cached on disk by a hash of the request (so rerunning a partly finished or extended grid
+only pays for the new calls), and the per-round agent state of all runs is written to a
+single Parquet file with one row per run, round and agent:
+
+    python experiments.py grid.json --output results.parquet --concurrency 8 --rate 4
+
+grid.json (every key is optional; missing ones use the defaults from app.py):
+
+    {
+        "persona_sets": {"team": {"personas": {"K": {"role": ..., "personality": ..., "goals": ...}, ...},
+                                  "turn_order": ["K", "C", "N"]}},
+        "situations": {"kvalitet": "Der er folk på teamet som ..."},
+        "leader_prompts": ["Hvad skal vi gøre i denne situation?"],
+        "seeds": [1, 2, 3],
+        "rounds": 3
+    }
+"""
+import os
+import json
+import time
+import argparse
+import itertools
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+
+import app
+from app import Scenario, TokenBucket, simulate_conversation, PERSONAS, SITUATION, LEADER_PROMPT
+from response_cache import ResponseCache, CACHE_MODES
+
+def load_grid(path):
+    with open(path, "r", encoding="utf-8") as f:
+        grid = json.load(f)
+    persona_sets = grid.get("persona_sets") or {"default": {"personas": PERSONAS, "turn_order": ["K", "C", "N"]}}
+    situations = grid.get("situations") or {"default": SITUATION}
+    leader_prompts = grid.get("leader_prompts") or [LEADER_PROMPT]
+    seeds = grid.get("seeds") or [None]
+    runs = []
+    for (persona_set, personas), (situation_name, situation), leader_prompt, seed in itertools.product(
+            persona_sets.items(), situations.items(), leader_prompts, seeds):
+        scenario = Scenario(
+            personas=personas["personas"],
+            situation=situation,
+            leader_prompt=leader_prompt,
+            turn_order=personas.get("turn_order") or list(personas["personas"]),
+            seed=seed,
+        )
+        runs.append({"persona_set": persona_set, "situation": situation_name, "leader_prompt": leader_prompt,
+                     "seed": seed, "scenario": scenario})
+    return runs, grid.get("rounds", 1)
+
+def run_to_rows(run_id, run, store):
+    """One row per round and agent that replied, with the liking scores as parallel lists."""
+    rows = []
+    for state in store.rounds:
+        for i, agent in enumerate(store.agents):
+            if agent not in state.actions:
+                continue
+            targets = [other for j, other in enumerate(store.agents) if not np.isnan(state.liking[i, j])]
+            rows.append({
+                "run_id": run_id,
+                "persona_set": run["persona_set"],
+                "situation": run["situation"],
+                "leader_prompt": run["leader_prompt"],
+                "seed": run["seed"],
+                "round": state.round,
+                "agent": agent,
+                "action": state.actions[agent],
+                "emotions": state.emotions[agent],
+                "liking_targets": targets,
+                "liking_scores": [float(state.liking[i, store.agents.index(other)]) for other in targets],
+            })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Kør groupsim over et gitter af personaer, situationer, lederbeskeder og seeds.")
+    parser.add_argument("grid", type=str, help="JSON-fil med gitteret (se toppen af experiments.py).")
+    parser.add_argument("--output", type=str, default="results.parquet", help="Parquet-fil med resultaterne (default: results.parquet).")
+    parser.add_argument("--cache_dir", type=str, default="response_cache", help="Mappe med gemte LLM-svar (default: response_cache).")
+    parser.add_argument("--cache_mode", choices=CACHE_MODES, default="record_on_miss",
+                        help="record_on_miss (default): genbrug gemte svar. replay: kun gemte svar. record: altid nye svar.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Antal simulationer der kører samtidig (default: 4).")
+    parser.add_argument("--rate", type=float, default=2.0, help="Gennemsnitligt antal LLM-kald per sekund i alt (default: 2).")
+    parser.add_argument("--burst", type=int, default=4, help="Antal LLM-kald der må sendes på én gang (default: 4).")
+    parser.add_argument("--mode", choices=["sequential", "parallel"], default="parallel",
+                        help="parallel (default): agenterne i en runde svarer samtidig. sequential: agenterne svarer efter tur.")
+    parser.add_argument("--summarizer", choices=["llm", "heuristic"], default="heuristic", help="Opsummering af ældre replikker (default: heuristic).")
+    parser.add_argument("--verbose", action="store_true", help="Vis simulationernes output.")
+    args = parser.parse_args()
+
+    runs, rounds = load_grid(args.grid)
+    app.response_cache = ResponseCache(args.cache_dir, args.cache_mode)
+    bucket = TokenBucket(args.rate, capacity=args.burst) # Shared, so the limit holds across all runs
+    print(f"Kører {len(runs)} simulationer à {rounds} runder med {args.concurrency} samtidige")
+
+    def run_simulation(run):
+        # Every run has its own event loop and async client in its thread
+        _, store = simulate_conversation(rounds=rounds, mode=args.mode, summarizer=args.summarizer,
+                                         scenario=run["scenario"], bucket=bucket)
+        return store
+
+    rows = []
+    errors = []
+    start_time = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull):
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            futures = {executor.submit(run_simulation, run): run_id for run_id, run in enumerate(runs)}
+            for future in as_completed(futures):
+                run_id = futures[future]
+                try:
+                    rows.extend(run_to_rows(run_id, runs[run_id], future.result()))
+                except Exception as e:
+                    errors.append(f"Simulation {run_id} fejlede: {e}")
+
+    for error in errors:
+        print(error)
+    if rows:
+        pd.DataFrame(rows).sort_values(["run_id", "round"], kind="stable").to_parquet(args.output, index=False)
+    cache = app.response_cache
+    print(f"{len(runs) - len(errors)} af {len(runs)} simulationer færdige på {time.perf_counter() - start_time:.1f}s, "
+          f"{len(rows)} rækker skrevet til {args.output}")
+    print(f"LLM-svar: {cache.hits} fra cachen, {cache.misses} nye")
+
+if __name__ == "__main__":
+    main()
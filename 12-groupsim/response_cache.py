@@ -0,0 +1,64 @@
+import os
+import json
+import threading
+from hashlib import sha256
+
+# record:         always call the LLM and store the response, overwriting earlier ones
+# replay:         only use stored responses; a request without one raises ReplayMissError
+# record_on_miss: use the stored response if there is one, otherwise call the LLM and store it
+CACHE_MODES = ("record", "replay", "record_on_miss")
+
+class ReplayMissError(Exception):
+    """A request in replay mode has no recorded response."""
+
+class ResponseCache:
+    """
+    LLM responses on disk, one JSON file per request, keyed by a hash of the request
+    (model, messages, temperature and any other options such as response_format and seed).
+    Safe to share between threads; files are written atomically.
+    """
+
+    def __init__(self, cache_dir, mode="record_on_miss"):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode {mode}, expected one of {CACHE_MODES}")
+        self.cache_dir = cache_dir
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(request):
+        return sha256(json.dumps(request, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, request):
+        """Returns the recorded response text for request, or None if the LLM has to be called."""
+        if self.mode == "record":
+            with self._lock:
+                self.misses += 1
+            return None
+        path = self._path(self.key(request))
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                response = json.load(f)["response"]
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            if self.mode == "replay":
+                raise ReplayMissError(f"No recorded response for request {self.key(request)} in {self.cache_dir}")
+            return None
+        with self._lock:
+            self.hits += 1
+        return response
+
+    def put(self, request, response):
+        path = self._path(self.key(request))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"request": request, "response": response}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
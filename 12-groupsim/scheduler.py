@@ -0,0 +1,111 @@
+import re
+import random
+from collections import defaultdict, deque
+
+# Building blocks for generated teams of any size
+ROLES = ["Udvikler", "Udvikler", "Udvikler", "Tester", "Tech Lead", "Product Owner", "UX designer", "DevOps"]
+PERSONALITIES = [
+    "struktureret, kvalitetsorienteret, samarbejdsvillig",
+    "autonom, pragmatisk, modvillig over for proces",
+    "målrettet, ustruktureret, ufølsom over for andre",
+    "analytisk, detaljefokuseret, stressfølsom",
+    "udadvendt, konfliktsky, hjælpsom",
+    "ambitiøs, utålmodig, direkte",
+    "rolig, erfaren, skeptisk over for nye ideer",
+]
+GOALS = [
+    "hurtig levering, tid til at kode selv",
+    "høj kvalitet, stabilitet, testbarhed",
+    "klare aftaler og godt samarbejde",
+    "anerkendelse og karriere",
+    "ro på opgaverne og færre møder",
+    "tilfredse brugere",
+]
+
+POLICIES = ("addressed", "salience", "random")
+
+def generate_personas(n, seed=None):
+    """A team of n generated personas named A1, A2, ..."""
+    rng = random.Random(seed)
+    return {
+        f"A{i + 1}": {
+            "role": rng.choice(ROLES),
+            "personality": rng.choice(PERSONALITIES),
+            "goals": rng.choice(GOALS),
+        }
+        for i in range(n)
+    }
+
+class SpeakerScheduler:
+    """
+    Chooses who speaks each round, and which other agents each speaker needs to know about,
+    so a round costs O(max_speakers) LLM calls with O(max_relevant) profiles each, however large the team.
+
+    Policies:
+      addressed: agents addressed (or named) in the previous round speak first, the rest by salience
+      salience:  agents that are addressed often and have not spoken for a while
+      random:    a random subset
+    """
+
+    def __init__(self, agents, max_speakers=4, max_relevant=5, policy="addressed", seed=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy}, expected one of {POLICIES}")
+        self.agents = list(agents)
+        self.max_speakers = max_speakers
+        self.max_relevant = max_relevant
+        self.policy = policy
+        self.rng = random.Random(seed)
+        self.round = 0
+        self.last_spoke = {}
+        self.addressed = defaultdict(float) # agent -> decayed number of times it was addressed
+        self.last_addressed = [] # agents addressed in the previous round, in order
+        self._round_addressed = []
+        self.contacts = defaultdict(lambda: deque(maxlen=max_relevant)) # agent -> agents it talked with, most recent last
+        self.recent_speakers = deque(maxlen=max_relevant * 2)
+        self._patterns = {agent: re.compile(rf"(?<!\w){re.escape(agent)}(?!\w)") for agent in self.agents}
+
+    def salience(self, agent):
+        return self.addressed[agent] + 0.1 * (self.round - self.last_spoke.get(agent, -1)) + 0.01 * self.rng.random()
+
+    def choose(self):
+        """The agents that speak this round, in speaking order."""
+        if self.policy == "random":
+            return self.rng.sample(self.agents, min(self.max_speakers, len(self.agents)))
+        speakers = []
+        if self.policy == "addressed":
+            speakers = list(dict.fromkeys(a for a in self.last_addressed if a in self.agents))[:self.max_speakers]
+        rest = sorted((a for a in self.agents if a not in speakers), key=self.salience, reverse=True)
+        return speakers + rest[:self.max_speakers - len(speakers)]
+
+    def relevant(self, agent):
+        """The other agents whose profiles and messages the agent sees: its recent contacts, then the latest speakers."""
+        candidates = list(reversed(self.contacts[agent])) + list(reversed(self.recent_speakers))
+        relevant = [a for a in dict.fromkeys(candidates) if a != agent and a in self._patterns]
+        if len(relevant) < self.max_relevant:
+            others = [a for a in self.agents if a != agent and a not in relevant]
+            relevant += self.rng.sample(others, min(len(others), self.max_relevant - len(relevant)))
+        return relevant[:self.max_relevant]
+
+    def mentions(self, text):
+        return [agent for agent, pattern in self._patterns.items() if pattern.search(text)]
+
+    def mentions_agent(self, agent, text):
+        return bool(self._patterns[agent].search(text))
+
+    def observe(self, agent, text, addresses=()):
+        """Records a turn: who spoke, and whom it addressed explicitly or named in the text."""
+        addressed = [a for a in dict.fromkeys(list(addresses) + self.mentions(text)) if a != agent and a in self._patterns]
+        for other in addressed:
+            self.addressed[other] += 1
+            self.contacts[agent].append(other)
+            self.contacts[other].append(agent)
+        self._round_addressed.extend(addressed)
+        self.last_spoke[agent] = self.round
+        self.recent_speakers.append(agent)
+
+    def end_round(self):
+        self.last_addressed = self._round_addressed
+        self._round_addressed = []
+        for agent in self.addressed:
+            self.addressed[agent] *= 0.5 # Older addressing counts less
+        self.round += 1
@@ -0,0 +1,104 @@
+// Runs the TypeScript tick engine (src/simulation/simulation.ts) headlessly under Node, with Math.random
+// replaced by a seeded generator, and prints the per-tick counts and the final work unit states as JSON.
+// Used by `python orgsim_engine.py <config> --crosscheck`; needs the TypeScript compiler from `npm install`,
+// or Node 22.13+ which can transpile it on its own.
+//
+//   node crosscheck_engine.mjs <config.json> [seed] [maxTicks]
+import fs from 'fs';
+import os from 'os';
+import path from 'path';
+import zlib from 'zlib';
+import module, { createRequire } from 'module';
+import { fileURLToPath, pathToFileURL } from 'url';
+
+const here = path.dirname(fileURLToPath(import.meta.url));
+const projectDir = path.join(here, '..', '..');
+const require = createRequire(path.join(projectDir, 'package.json'));
+
+function transpile(source) {
+  let ts;
+  try {
+    ts = require('typescript');
+  } catch {
+    if (!module.stripTypeScriptTypes) {
+      throw new Error('TypeScript not found: run npm install in 13-orgsim or use Node 22.13+');
+    }
+    return module.stripTypeScriptTypes(source, { mode: 'transform' });
+  }
+  return ts.transpileModule(source, {
+    compilerOptions: { module: ts.ModuleKind.ESNext, target: ts.ScriptTarget.ES2020 },
+  }).outputText;
+}
+
+// Same generator as mulberry32 in orgsim_engine.py
+function mulberry32(seed) {
+  let state = seed >>> 0;
+  return () => {
+    state = (state + 0x6D2B79F5) >>> 0;
+    let t = Math.imul(state ^ (state >>> 15), state | 1);
+    t = (t + Math.imul(t ^ (t >>> 7), t | 61)) ^ t;
+    return ((t ^ (t >>> 14)) >>> 0) / 4294967296;
+  };
+}
+
+// Same formats as load_config in orgsim_engine.py: JSON or NDJSON (.ndjson), optionally gzipped (.gz)
+function loadConfig(configPath) {
+  let text = fs.readFileSync(configPath);
+  if (configPath.endsWith('.gz')) {
+    text = zlib.gunzipSync(text);
+  }
+  if (!configPath.replace(/\.gz$/, '').endsWith('.ndjson')) {
+    return JSON.parse(text.toString('utf8'));
+  }
+  const config = {};
+  for (const line of text.toString('utf8').split('\n').filter(line => line.trim())) {
+    for (const [name, value] of Object.entries(JSON.parse(line))) {
+      if (Array.isArray(value)) {
+        config[name] = (config[name] ?? []).concat(value);
+      } else if (value !== null && typeof value === 'object') {
+        config[name] = { ...config[name], ...value };
+      } else {
+        config[name] = value;
+      }
+    }
+  }
+  return config;
+}
+
+const [configPath, seed = '42', maxTicks = '10000'] = process.argv.slice(2);
+
+const outDir = fs.mkdtempSync(path.join(os.tmpdir(), 'orgsim-'));
+for (const name of ['types', 'simulation']) {
+  const source = fs.readFileSync(path.join(projectDir, 'src', 'simulation', `${name}.ts`), 'utf8');
+  fs.writeFileSync(path.join(outDir, `${name}.mjs`), transpile(source).replace(/(from\s+['"])\.\/types(['"])/g, '$1./types.mjs$2'));
+}
+const { TickState } = await import(pathToFileURL(path.join(outDir, 'types.mjs')).href);
+const { default: OrgSimulation } = await import(pathToFileURL(path.join(outDir, 'simulation.mjs')).href);
+fs.rmSync(outDir, { recursive: true, force: true });
+
+Math.random = mulberry32(Number(seed));
+console.log = () => {}; // simulation.ts logs every tick while work units are unassigned
+
+const config = loadConfig(configPath);
+const simulation = OrgSimulation.getInstance();
+simulation.initialize(config);
+const state = simulation['state']; // The live state; getState() copies the whole event log every tick
+
+const ticks = [];
+for (let tick = 0; tick < Number(maxTicks); tick++) {
+  const tickState = simulation.tick();
+  const units = state.workUnits;
+  const done = units.filter(wu => wu.type === 'done').length;
+  const backlog = units.filter(wu => wu.currentTeamOwnerId !== null && wu.currentOwnerId === null).length;
+  const inProgress = units.filter(wu => wu.currentOwnerId !== null).length;
+  ticks.push([done, backlog, inProgress, units.length - done - backlog - inProgress]);
+  // orgsim_engine.py stops once no work is in progress, as nothing can change after that
+  if (tickState === TickState.COMPLETED || inProgress === 0) {
+    break;
+  }
+}
+
+process.stdout.write(JSON.stringify({
+  ticks,
+  units: state.workUnits.map(wu => [wu.type, wu.currentTeamOwnerId, wu.currentOwnerId]),
+}));
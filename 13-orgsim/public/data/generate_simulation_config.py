@@ -1,4 +1,5 @@
 import json
+import gzip
 import random
 import argparse
 
@@ -35,10 +36,14 @@ def generate_teams(num_total_teams):
 
 def generate_people(teams_list):
     """Generates the list of people for all teams."""
-    people = []
+    return list(iter_people(teams_list))
+
+def iter_people(teams_list, disciplines=AVAILABLE_DISCIPLINES, people_per_team_range=(5, 10), rng=random):
+    """
+    Yields the people for all teams, one team at a time. Regular team members get the
+    disciplines in order, repeating from the start for teams larger than the list.
+    """
     person_counter = 1
-    # Range for number of people in non-customer teams, as per requirement
-    people_per_team_range = (5, 10)
 
     customer_team_name = None
     for team in teams_list:
@@ -48,12 +53,12 @@ def generate_people(teams_list):
     
     if customer_team_name:
         for _ in range(5):
-            people.append({
+            yield {
                 "id": f"person_{person_counter}",
                 "name": f"Customer-{person_counter}",
                 "discipline": "Customer",
                 "initialTeamName": customer_team_name
-            })
+            }
             person_counter += 1
     else:
         # This should not happen if generate_teams always creates a customer team.
@@ -61,10 +66,10 @@ def generate_people(teams_list):
 
     regular_teams = [team for team in teams_list if not team.get("isCustomerTeam")]
     for team in regular_teams:        
-        num_people_in_team = random.randint(5, 10)
+        num_people_in_team = rng.randint(*people_per_team_range)
         team_people = []
         for i in range(num_people_in_team):
-            discipline = AVAILABLE_DISCIPLINES[i % len(AVAILABLE_DISCIPLINES)]
+            discipline = disciplines[i % len(disciplines)]
             person_name = f"{discipline}_{person_counter}"
             team_people.append({
                 "id": f"person_{person_counter}",
@@ -74,18 +79,86 @@ def generate_people(teams_list):
             })
             person_counter += 1
         team_people = sorted(team_people, key=lambda x: x["discipline"])
-        people.extend(team_people)
-    return people
+        yield from team_people
 
-def generate_initial_work_units(num_units):
+def generate_initial_work_units(num_units, range_encoded=False):
     """Generates initial work units, all of type 'idea'."""
-    work_units = []
+    return list(iter_initial_work_units(num_units, range_encoded))
+
+def iter_initial_work_units(num_units, range_encoded=False):
+    """
+    Yields the initial work units. Range-encoded, they are a single entry
+    {"type": "idea", "count": N, "idPrefix": "Work-", "firstId": 1} standing for Work-1 ... Work-N.
+    """
+    if range_encoded:
+        if num_units > 0:
+            yield {"type": "idea", "count": num_units, "idPrefix": "Work-", "firstId": 1}
+        return
     for i in range(num_units):
-        work_units.append({
+        yield {
             "id": f"Work-{i+1}",
             "type": "idea"
-        })
-    return work_units
+        }
+
+def work_flow_from_chain(chain):
+    """The workFlow for a chain of work unit types, e.g. ["idea", "need", "code"]; the last type leads to done."""
+    return {work_type: {"nextType": next_type} for work_type, next_type in zip(chain, list(chain[1:]) + ["done"])}
+
+def build_config(num_teams, num_work_units, disciplines=AVAILABLE_DISCIPLINES, people_per_team_range=(5, 10),
+                 person_work_ticks=PERSON_WORK_TICKS, work_flow=WORK_FLOW, seed=None):
+    """A complete config in memory, with range-encoded work units of the first type in the workflow."""
+    rng = random.Random(seed)
+    teams = generate_teams(num_teams)
+    first_type = next(iter(work_flow), "idea")
+    return {
+        "teams": teams,
+        "people": list(iter_people(teams, disciplines, people_per_team_range, rng)),
+        "initialWorkUnits": [{"type": first_type, "count": num_work_units, "idPrefix": "Work-", "firstId": 1}] if num_work_units > 0 else [],
+        "personWorkTicks": person_work_ticks,
+        "workFlow": work_flow
+    }
+
+def dumps_compact(item):
+    return json.dumps(item, separators=(",", ":"))
+
+def write_compact_json(f, sections):
+    """Writes the config as compact JSON, one item at a time, so no section has to be in memory."""
+    f.write("{")
+    for i, (name, value) in enumerate(sections.items()):
+        f.write(f"{',' if i else ''}{dumps_compact(name)}:")
+        if isinstance(value, dict):
+            f.write(dumps_compact(value))
+            continue
+        f.write("[")
+        for j, item in enumerate(value):
+            f.write(f"{',' if j else ''}{dumps_compact(item)}")
+        f.write("]")
+    f.write("}\n")
+
+def write_ndjson(f, sections, chunk_size=1000):
+    """
+    Writes the config as NDJSON: every line is a partial config whose lists extend and whose
+    objects update the config read so far, with up to chunk_size items per list.
+    """
+    for name, value in sections.items():
+        if isinstance(value, dict):
+            f.write(dumps_compact({name: value}) + "\n")
+            continue
+        chunk = []
+        for item in value:
+            chunk.append(item)
+            if len(chunk) == chunk_size:
+                f.write(dumps_compact({name: chunk}) + "\n")
+                chunk = []
+        if chunk:
+            f.write(dumps_compact({name: chunk}) + "\n")
+
+def counted(items, counts, name):
+    """Passes the items through while counting them in counts[name]."""
+    counts[name] = 0
+    for item in items:
+        counts[name] += item.get("count", 1)
+        yield item
 
 def main():
     random.seed(42);
@@ -112,6 +185,24 @@ def main():
         help="Name of the output JSON file (default: simulationConfig.json)."
     )
 
+    parser.add_argument(
+        "--format",
+        choices=["json", "compact", "ndjson"],
+        default="json",
+        help="json (default): indented JSON built in memory. compact: compact JSON written incrementally. "
+             "ndjson: one partial config per line, written incrementally; for very large configs."
+    )
+    parser.add_argument(
+        "--range_units",
+        action="store_true",
+        help="Write the initial work units as one range-encoded entry ('idea' x N) instead of N objects."
+    )
+    parser.add_argument(
+        "--gzip",
+        action="store_true",
+        help="Gzip the output file (adds .gz to its name)."
+    )
+
     args = parser.parse_args()
 
     if args.num_teams < 1:
@@ -122,30 +213,40 @@ def main():
         print("Error: Number of initial work units cannot be negative.")
         return
 
-    generated_teams = generate_teams(args.num_teams)
-    generated_people = generate_people(generated_teams)
-    generated_work_units = generate_initial_work_units(args.num_initial_workunits)
+    output_file = args.output_file
+    if args.gzip and not output_file.endswith(".gz"):
+        output_file += ".gz"
 
+    generated_teams = generate_teams(args.num_teams)
+    counts = {}
     config_data = {
         "teams": generated_teams,
-        "people": generated_people,
-        "initialWorkUnits": generated_work_units,
+        "people": counted(iter_people(generated_teams), counts, "people"),
+        "initialWorkUnits": counted(iter_initial_work_units(args.num_initial_workunits, args.range_units), counts, "work_units"),
         "personWorkTicks": PERSON_WORK_TICKS,
         "workFlow": WORK_FLOW
     }
 
     try:
-        with open(args.output_file, 'w') as f:
-            json.dump(config_data, f, indent=2)
-        print(f"Successfully generated '{args.output_file}'.")
+        opener = gzip.open if args.gzip else open
+        with opener(output_file, 'wt') as f:
+            if args.format == "compact":
+                write_compact_json(f, config_data)
+            elif args.format == "ndjson":
+                write_ndjson(f, config_data)
+            else:
+                config_data["people"] = list(config_data["people"])
+                config_data["initialWorkUnits"] = list(config_data["initialWorkUnits"])
+                json.dump(config_data, f, indent=2)
+        print(f"Successfully generated '{output_file}'.")
         num_regular_teams = len([t for t in generated_teams if not t.get("isCustomerTeam")])
         print(f"Configuration details:")
         print(f"  Total teams generated: {len(generated_teams)} (1 Customer team, {num_regular_teams} other teams)")
-        print(f"  Total people generated: {len(generated_people)}")
-        print(f"  Initial work units generated: {len(generated_work_units)}")
+        print(f"  Total people generated: {counts['people']}")
+        print(f"  Initial work units generated: {counts['work_units']}")
 
     except IOError:
-        print(f"Error: Could not write to file '{args.output_file}'.")
+        print(f"Error: Could not write to file '{output_file}'.")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,408 @@
+"""
+Headless Python port of the tick engine in src/simulation/simulation.ts, for running many org
+configs (capacity planning, sweeps) without a browser. It loads the same simulationConfig.json
+schema (teams, people, initialWorkUnits, personWorkTicks, workFlow), keeps the state in NumPy
+arrays and records throughput and backlog metrics for every tick:
+
+    python orgsim_engine.py simulationConfig.json --max_ticks 5000 --metrics_file metrics.csv
+
+The rules are the ones in simulation.ts, quirks included: initialize() counts the backlogs in the
+work unit list it is about to replace, so MAX_BACKLOG_SIZE never applies and every initial work unit
+goes to the first team with the discipline its next type needs. Unlike the browser, a run stops
+when no work is in progress any more, since nothing can change after that.
+
+--crosscheck runs the TypeScript engine on the same config under Node (crosscheck_engine.mjs, needs
+`npm install` in 13-orgsim or Node 22.13+) with the same seeded random numbers and compares every tick.
+"""
+import os
+import csv
+import gzip
+import json
+import heapq
+import bisect
+import argparse
+import subprocess
+from collections import defaultdict
+import numpy as np
+
+DONE = "done"
+NONE = -1
+
+# The outcome of a tick, as TickState in types.ts; stalled means the remaining work units can never be assigned
+RUNNING = "running"
+COMPLETED = "completed"
+STALLED = "stalled"
+
+METRICS = ["completed", "done", "backlog", "in_progress", "unassigned"]
+
+def mulberry32(seed):
+    """A seeded replacement for Math.random(), giving the same numbers as mulberry32 in crosscheck_engine.mjs."""
+    state = seed & 0xFFFFFFFF
+    def random():
+        nonlocal state
+        state = (state + 0x6D2B79F5) & 0xFFFFFFFF
+        t = ((state ^ (state >> 15)) * (state | 1)) & 0xFFFFFFFF
+        t = ((t + (((t ^ (t >> 7)) * (t | 61)) & 0xFFFFFFFF)) & 0xFFFFFFFF) ^ t
+        return (t ^ (t >> 14)) / 4294967296
+    return random
+
+def load_config(path):
+    """Loads a config as written by generate_simulation_config.py: JSON or NDJSON (.ndjson), optionally gzipped (.gz)."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        if not path.removesuffix(".gz").endswith(".ndjson"):
+            return json.load(f)
+        # Every line is a partial config: lists extend and objects update what was read so far
+        config = {}
+        for line in f:
+            if not line.strip():
+                continue
+            for name, value in json.loads(line).items():
+                if isinstance(value, list):
+                    config.setdefault(name, []).extend(value)
+                elif isinstance(value, dict):
+                    config.setdefault(name, {}).update(value)
+                else:
+                    config[name] = value
+        return config
+
+class WorkUnitIds:
+    """
+    The ids of the initial work units. Range-encoded entries ({"type", "count", "idPrefix", "firstId"},
+    standing for idPrefix + firstId ... idPrefix + (firstId + count - 1)) stay ranges instead of count strings.
+    """
+
+    def __init__(self, units):
+        self.starts = [] # Index of the first work unit in each block
+        self.blocks = [] # (idPrefix, firstId) for a range, or a list of ids
+        explicit = None
+        n = 0
+        for unit in units:
+            if "count" in unit:
+                if unit["count"] > 0:
+                    self.starts.append(n)
+                    self.blocks.append((unit.get("idPrefix", "Work-"), unit.get("firstId", 1)))
+                    n += unit["count"]
+                explicit = None
+                continue
+            if explicit is None:
+                explicit = []
+                self.starts.append(n)
+                self.blocks.append(explicit)
+            explicit.append(unit.get("id") or f"wu_{n}")
+            n += 1
+        self.length = n
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, unit):
+        if not 0 <= unit < self.length:
+            raise IndexError(unit)
+        block = bisect.bisect_right(self.starts, unit) - 1
+        offset = unit - self.starts[block]
+        if isinstance(self.blocks[block], list):
+            return self.blocks[block][offset]
+        prefix, first_id = self.blocks[block]
+        return f"{prefix}{first_id + offset}"
+
+    def __iter__(self):
+        return (self[unit] for unit in range(self.length))
+
+class OrgSimulation:
+    """
+    The org simulation with one entry per team, person and work unit in NumPy arrays.
+    People are stored team by team in config order, so array order is the order simulation.ts visits them in.
+
+    random() returns floats in [0, 1) like Math.random(); by default it is a NumPy generator seeded with seed.
+    """
+
+    def __init__(self, config, seed=None, random=None):
+        if random is None:
+            rng = np.random.default_rng(seed)
+            random = rng.random
+        self.random = random
+        self.tick_count = 0
+
+        # Work unit types and disciplines as indices
+        work_ticks = config["personWorkTicks"]
+        work_flow = config["workFlow"]
+        types = [DONE] + list(work_flow)
+        types += [entry["nextType"] for entry in work_flow.values() if entry and entry.get("nextType")]
+        types += [t for ticks in work_ticks.values() for t in ticks]
+        types += [unit["type"] for unit in config["initialWorkUnits"]]
+        self.types = list(dict.fromkeys(types))
+        self.type_index = {t: i for i, t in enumerate(self.types)}
+        self.done_type = self.type_index[DONE]
+        self.disciplines = list(dict.fromkeys(list(work_ticks) + [person["discipline"] for person in config["people"]]))
+        self.discipline_index = {d: i for i, d in enumerate(self.disciplines)}
+
+        self.type_discipline = np.full(len(self.types), NONE, dtype=np.int32) # Later disciplines win, as in simulation.ts
+        self.work_ticks = np.full((len(self.disciplines), len(self.types)), NONE, dtype=np.int32)
+        for discipline, ticks in work_ticks.items():
+            for t, n in ticks.items():
+                self.type_discipline[self.type_index[t]] = self.discipline_index[discipline]
+                self.work_ticks[self.discipline_index[discipline], self.type_index[t]] = n
+        self.next_type = np.full(len(self.types), NONE, dtype=np.int32)
+        for t, entry in work_flow.items():
+            if entry and entry.get("nextType"):
+                self.next_type[self.type_index[t]] = self.type_index[entry["nextType"]]
+
+        # Teams and people
+        self.team_ids = [team["id"] for team in config["teams"]]
+        self.team_names = [team["name"] for team in config["teams"]]
+        team_by_name = {team["name"]: i for i, team in enumerate(config["teams"])}
+        members = [[] for _ in self.team_ids]
+        for person in config["people"]:
+            team = team_by_name.get(person["initialTeamName"])
+            if team is None:
+                print(f"Warning: Team \"{person['initialTeamName']}\" not found for person \"{person['name']}\".")
+                continue
+            members[team].append(person)
+        people = [person for team_members in members for person in team_members]
+        self.person_ids = [person["id"] for person in people]
+        self.person_team = np.repeat(np.arange(len(self.team_ids), dtype=np.int32), [len(m) for m in members])
+        self.person_discipline = np.array([self.discipline_index[person["discipline"]] for person in people], dtype=np.int32)
+        self.person_remaining = np.zeros(len(people), dtype=np.int32)
+        self.person_unit = np.full(len(people), NONE, dtype=np.int32)
+        self.team_has = np.zeros((len(self.team_ids), len(self.disciplines)), dtype=bool)
+        self.team_has[self.person_team, self.person_discipline] = True
+
+        # Work units
+        units = config["initialWorkUnits"]
+        self.unit_ids = WorkUnitIds(units)
+        blocks = []
+        explicit = []
+        for unit in units:
+            if "count" in unit:
+                blocks += [np.array(explicit, dtype=np.int32), np.full(unit["count"], self.type_index[unit["type"]], dtype=np.int32)]
+                explicit = []
+            else:
+                explicit.append(self.type_index[unit["type"]])
+        self.unit_type = np.concatenate(blocks + [np.array(explicit, dtype=np.int32)])
+        n_units = len(self.unit_type)
+        self.unit_team = np.full(n_units, NONE, dtype=np.int32)
+        self.unit_owner = np.full(n_units, NONE, dtype=np.int32)
+        self.start_tick = np.full(n_units, NONE, dtype=np.int32) # First tick someone worked on the unit
+        self.done_tick = np.full(n_units, NONE, dtype=np.int32)
+
+        # Backlog indexes, updated on every ownership change so a tick never scans all work units:
+        # per (team, discipline) heaps of waiting work units and idle people, both by index as simulation.ts
+        # visits them in that order, and the pairs whose heaps changed since their last assignment round
+        self.waiting = defaultdict(list)
+        self.idle = defaultdict(list)
+        self.changed = set()
+        self.backlog_count = np.zeros(len(self.team_ids), dtype=np.int64)
+        self.done_count = int(np.count_nonzero(self.unit_type == self.done_type))
+        self.in_progress_count = 0
+        for person, (team, discipline) in enumerate(zip(self.person_team.tolist(), self.person_discipline.tolist())):
+            self.idle[team, discipline].append(person)
+        self._assign_initial()
+
+        self.metrics = {name: [] for name in METRICS}
+        self.team_backlog = []
+
+    def team_backlog_counts(self):
+        """Number of work units waiting in each team's backlog."""
+        return self.backlog_count.copy()
+
+    def _add_to_backlog(self, unit, team):
+        self.unit_team[unit] = team
+        key = (team, int(self.type_discipline[self.unit_type[unit]]))
+        heapq.heappush(self.waiting[key], unit)
+        self.changed.add(key)
+        self.backlog_count[team] += 1
+
+    def _least_backlogged(self, discipline, exclude=NONE):
+        """The team with the smallest backlog that has the discipline (the first one on ties), or NONE."""
+        if discipline == NONE:
+            return NONE
+        eligible = self.team_has[:, discipline].copy()
+        if exclude != NONE:
+            eligible[exclude] = False
+        if not eligible.any():
+            return NONE
+        counts = np.where(eligible, self.backlog_count, np.iinfo(np.int64).max)
+        return int(np.argmin(counts))
+
+    def _assign_initial(self):
+        # simulation.ts sorts the teams by backlog counts that are all zero at this point, so the first suitable team wins
+        first_team = np.where(self.team_has.any(axis=0), np.argmax(self.team_has, axis=0), NONE)
+        first_team = np.append(first_team, NONE) # Index NONE: no discipline
+        next_type = np.append(self.next_type, NONE)[self.unit_type]
+        team = first_team[np.append(self.type_discipline, NONE)[next_type]]
+        units = np.flatnonzero(team != NONE)
+        self.unit_team[units] = team[units]
+        self.backlog_count += np.bincount(team[units], minlength=len(self.team_ids))
+        # Group the units by (team, discipline of their current type); a stable sort keeps them in index order, so every list is a heap
+        discipline = self.type_discipline[self.unit_type[units]]
+        keys = team[units].astype(np.int64) * (len(self.disciplines) + 1) + discipline + 1
+        order = np.argsort(keys, kind="stable")
+        groups, starts = np.unique(keys[order], return_index=True)
+        for key, group in zip(groups.tolist(), np.split(units[order], starts[1:])):
+            team_discipline = (key // (len(self.disciplines) + 1), key % (len(self.disciplines) + 1) - 1)
+            self.waiting[team_discipline] = group.tolist()
+            self.changed.add(team_discipline)
+
+    def _work_ticks(self, discipline, unit_type):
+        ticks = self.work_ticks[discipline, unit_type]
+        if ticks == NONE:
+            raise ValueError(f"No work ticks for {self.disciplines[discipline]}/{self.types[unit_type]}")
+        return int(ticks) + int(self.random() * 3)
+
+    def tick(self):
+        self.tick_count += 1
+
+        # 1. People work on their current work units
+        working = (self.person_unit >= 0) & (self.person_remaining > 0)
+        self.person_remaining[working] -= 1
+        finished = np.flatnonzero(working & (self.person_remaining == 0))
+
+        # 2. Completed work units move on to their next type, in the same team if it has the discipline
+        completed = 0
+        for person in finished.tolist():
+            unit = int(self.person_unit[person])
+            unit_type = self.unit_type[unit]
+            next_type = self.next_type[unit_type]
+            if next_type == NONE:
+                raise ValueError(f"No workFlow entry for work unit type {self.types[unit_type]}")
+            team = int(self.person_team[person])
+            self.person_unit[person] = NONE
+            key = (team, int(self.person_discipline[person]))
+            heapq.heappush(self.idle[key], person)
+            self.changed.add(key)
+            self.unit_owner[unit] = NONE
+            self.unit_team[unit] = NONE
+            self.unit_type[unit] = next_type
+            self.in_progress_count -= 1
+            if next_type == self.done_type:
+                self.done_tick[unit] = self.tick_count
+                self.done_count += 1
+                completed += 1
+                continue
+            discipline = self.type_discipline[next_type]
+            if discipline == NONE or not self.team_has[team, discipline]:
+                team = self._least_backlogged(discipline, exclude=team)
+            if team != NONE:
+                self._add_to_backlog(unit, team)
+
+        # 3. Backlog work units go to the first idle team member with the right discipline, in work unit order.
+        # Only pairs that got a work unit or an idle person can match; the rest were matched as far as possible before.
+        assignments = []
+        for key in self.changed:
+            waiting, idle = self.waiting[key], self.idle[key]
+            while waiting and idle:
+                assignments.append((heapq.heappop(waiting), heapq.heappop(idle)))
+        self.changed.clear()
+        for unit, person in sorted(assignments): # Random numbers are drawn in work unit order, as in simulation.ts
+            self.person_remaining[person] = self._work_ticks(self.person_discipline[person], self.unit_type[unit])
+            self.person_unit[person] = unit
+            self.unit_owner[unit] = person
+            self.backlog_count[self.unit_team[unit]] -= 1
+            if self.start_tick[unit] == NONE:
+                self.start_tick[unit] = self.tick_count
+        self.in_progress_count += len(assignments)
+
+        self._record(completed)
+        if self.done_count == len(self.unit_type):
+            return COMPLETED
+        if self.in_progress_count == 0:
+            return STALLED
+        return RUNNING
+
+    def _record(self, completed):
+        backlog = int(self.backlog_count.sum())
+        self.metrics["completed"].append(completed)
+        self.metrics["done"].append(self.done_count)
+        self.metrics["backlog"].append(backlog)
+        self.metrics["in_progress"].append(self.in_progress_count)
+        self.metrics["unassigned"].append(len(self.unit_type) - self.done_count - backlog - self.in_progress_count)
+        self.team_backlog.append(self.team_backlog_counts())
+
+    def run(self, max_ticks=10000):
+        """Ticks until the simulation completes or stalls, or for max_ticks ticks; returns the last tick state."""
+        state = RUNNING
+        while state == RUNNING and self.tick_count < max_ticks:
+            state = self.tick()
+        return state
+
+    def get_metrics(self):
+        """Per-tick metrics as arrays: tick, completed (throughput), done, backlog, in_progress, unassigned and team_backlog (ticks x teams)."""
+        metrics = {"tick": np.arange(1, self.tick_count + 1, dtype=np.int32)}
+        metrics.update({name: np.array(values, dtype=np.int32) for name, values in self.metrics.items()})
+        metrics["team_backlog"] = np.array(self.team_backlog, dtype=np.int32).reshape(self.tick_count, len(self.team_ids))
+        return metrics
+
+    def unit_states(self):
+        """(type, team id, owner id) for every work unit, with None for no team or owner."""
+        return [
+            (self.types[unit_type], self.team_ids[team] if team != NONE else None, self.person_ids[owner] if owner != NONE else None)
+            for unit_type, team, owner in zip(self.unit_type, self.unit_team, self.unit_owner)
+        ]
+
+def write_metrics(path, simulation):
+    metrics = simulation.get_metrics()
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["tick"] + METRICS + [f"backlog_{team_id}" for team_id in simulation.team_ids])
+        for i in range(len(metrics["tick"])):
+            writer.writerow([metrics["tick"][i]] + [metrics[name][i] for name in METRICS] + list(metrics["team_backlog"][i]))
+
+def crosscheck(config_path, seed, max_ticks):
+    """Runs the TypeScript and the Python engine with the same random numbers; returns a list of differences."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "crosscheck_engine.mjs")
+    result = subprocess.run(["node", script, config_path, str(seed), str(max_ticks)], capture_output=True, text=True)
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines() or ["no output"]
+        return [f"The TypeScript engine failed: {next((line for line in lines if line.split(':')[0].endswith('Error')), lines[-1])}"]
+    expected = json.loads(result.stdout)
+
+    simulation = OrgSimulation(load_config(config_path), random=mulberry32(seed))
+    simulation.run(max_ticks)
+    metrics = simulation.get_metrics()
+    ticks = [[int(metrics[name][i]) for name in ["done", "backlog", "in_progress", "unassigned"]] for i in range(simulation.tick_count)]
+
+    differences = []
+    if len(ticks) != len(expected["ticks"]):
+        differences.append(f"Python ran {len(ticks)} ticks, TypeScript {len(expected['ticks'])}")
+    for i, (python_tick, ts_tick) in enumerate(zip(ticks, expected["ticks"])):
+        if python_tick != ts_tick:
+            differences.append(f"Tick {i + 1}: done, backlog, in progress, unassigned {python_tick} in Python, {ts_tick} in TypeScript")
+            break
+    for unit_id, python_unit, ts_unit in zip(simulation.unit_ids, simulation.unit_states(), expected["units"]):
+        if list(python_unit) != ts_unit:
+            differences.append(f"Work unit {unit_id} ends as {python_unit} in Python, {tuple(ts_unit)} in TypeScript")
+            break
+    return differences
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the org simulation headlessly on a simulationConfig.json file.")
+    parser.add_argument("config", type=str, nargs="?", default="simulationConfig.json", help="Config file (default: simulationConfig.json).")
+    parser.add_argument("--max_ticks", type=int, default=10000, help="Stop after this many ticks (default: 10000).")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the random extra work ticks (default: 42).")
+    parser.add_argument("--metrics_file", type=str, default=None, help="Write the per-tick metrics to this CSV file.")
+    parser.add_argument("--crosscheck", action="store_true", help="Compare with the TypeScript engine under Node instead (use small configs).")
+    args = parser.parse_args()
+
+    if args.crosscheck:
+        differences = crosscheck(args.config, args.seed, args.max_ticks)
+        for difference in differences:
+            print(difference)
+        print("The Python and TypeScript engines differ." if differences else "The Python and TypeScript engines agree on every tick.")
+        return
+
+    simulation = OrgSimulation(load_config(args.config), seed=args.seed)
+    state = simulation.run(args.max_ticks)
+    metrics = simulation.get_metrics()
+    done = metrics["done"][-1] if simulation.tick_count else 0
+    print(f"Simulation {state} after {simulation.tick_count} ticks: {done} of {len(simulation.unit_ids)} work units done")
+    if simulation.tick_count:
+        print(f"  Throughput: {done / simulation.tick_count:.3f} work units per tick")
+        print(f"  Backlog: {metrics['backlog'].mean():.1f} on average, {metrics['backlog'].max()} at most")
+        print(f"  Unassigned at the end: {metrics['unassigned'][-1]}")
+    if args.metrics_file:
+        write_metrics(args.metrics_file, simulation)
+        print(f"Metrics written to '{args.metrics_file}'.")
+
+if __name__ == "__main__":
+    main()
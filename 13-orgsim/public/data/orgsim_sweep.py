@@ -0,0 +1,194 @@
+"""
+Runs orgsim_engine.py over a grid of team topologies, work ticks and workflows.
+
+Every config is built in memory (no JSON files), the runs are spread over a process pool and
+the lead-time, throughput and backlog metrics of all runs are written to one CSV table with a
+row per run:
+
+    python orgsim_sweep.py sweep.json --output sweep.csv --processes 8
+
+sweep.json (every key is optional; missing ones use the defaults from generate_simulation_config.py):
+
+    {
+        "num_teams": [5, 10, 20],
+        "num_work_units": 1000,
+        "discipline_mixes": {"default": ["PM", "Designer", "SwDev", ...], "more_testers": [...]},
+        "team_sizes": {"5-10": [5, 10], "8": [8, 8]},
+        "person_work_ticks": {"default": {"SwDev": {"code": 24}, ...}},
+        "work_flows": {"full": ["idea", "need", "design", "task", "code", "release"], "no_design": [...]},
+        "seeds": [1, 2, 3],
+        "max_ticks": 20000
+    }
+
+A workflow is the chain of work unit types; the last one leads to done, and the initial work units
+are of the first type. As in simulation.ts, an initial work unit is handed to the first team with the
+discipline of the *second* type, but waits there for someone with the discipline of the first type.
+load_sweep rejects every workflow that cannot progress with a team makeup, rather than writing stalled
+rows: one with fewer than two types, a type no discipline in person_work_ticks works on or no team has
+people for, or a first team (for the second type) that does not always have the first type's discipline.
+The customer team comes first and only has Customers, so ["idea", "code"] is rejected, for example.
+"""
+import os
+import csv
+import json
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+from generate_simulation_config import AVAILABLE_DISCIPLINES, PERSON_WORK_TICKS, WORK_FLOW, build_config, work_flow_from_chain
+from orgsim_engine import OrgSimulation
+
+COLUMNS = [
+    "run_id", "num_teams", "discipline_mix", "team_size", "work_ticks", "work_flow", "seed",
+    "people", "work_units", "status", "ticks", "done", "throughput",
+    "lead_time_mean", "lead_time_p50", "lead_time_p90", "cycle_time_mean", "cycle_time_p90",
+    "backlog_mean", "backlog_max", "utilization",
+]
+
+def chain_problem(chain, disciplines, people_per_team, person_work_ticks):
+    """Why runs of this workflow with these teams cannot finish their work units, or None if they can."""
+    if len(chain) < 2:
+        return "needs at least two work unit types, as initial work units go to a team by the discipline of the second"
+    # The discipline working on each type; later disciplines win, as in the engine
+    worked_by = {work_type: discipline for discipline, ticks in person_work_ticks.items() for work_type in ticks}
+    missing = [work_type for work_type in chain if work_type not in worked_by]
+    if missing:
+        return f"no discipline in person_work_ticks works on {', '.join(missing)}"
+    # Regular team members get the disciplines in order, so a team of n people has the first n of them
+    smallest, largest = people_per_team
+    for work_type in chain:
+        discipline = worked_by[work_type]
+        if discipline != "Customer" and (discipline not in disciplines or disciplines.index(discipline) >= largest):
+            return f"no team has a {discipline} for {work_type}"
+    first, second = worked_by[chain[0]], worked_by[chain[1]]
+    if second == "Customer":
+        starts = first == "Customer" # The customer team comes first and only has Customers
+    else:
+        team_size = max(smallest, disciplines.index(second) + 1) # At least the size of the first team with a second
+        starts = first in disciplines and disciplines.index(first) < team_size
+    if not starts:
+        return (f"{chain[0]} work units wait for a {first} in the first team with a {second} (for {chain[1]}), "
+                f"which does not have one in every run")
+    return None
+
+def load_sweep(path):
+    """The runs of the grid in path; raises ValueError if a workflow cannot progress with a team makeup."""
+    grid = {}
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            grid = json.load(f)
+    discipline_mixes = grid.get("discipline_mixes") or {"default": AVAILABLE_DISCIPLINES}
+    team_sizes = grid.get("team_sizes") or {"5-10": [5, 10]}
+    person_work_ticks = grid.get("person_work_ticks") or {"default": PERSON_WORK_TICKS}
+    work_flows = grid.get("work_flows") or {"default": list(WORK_FLOW)}
+
+    problems = []
+    for (mix, disciplines), (size, people_per_team), (ticks, work_ticks), (flow, chain) in itertools.product(
+            discipline_mixes.items(), team_sizes.items(), person_work_ticks.items(), work_flows.items()):
+        problem = chain_problem(chain, disciplines, people_per_team, work_ticks)
+        if problem:
+            problems.append(f"work_flow {flow} with discipline_mix {mix}, team_size {size}, work_ticks {ticks}: {problem}")
+    if problems:
+        raise ValueError("Workflows that would stall:\n  " + "\n  ".join(problems))
+
+    runs = []
+    for num_teams, (mix, disciplines), (size, people_per_team), (ticks, work_ticks), (flow, chain), seed in itertools.product(
+            grid.get("num_teams") or [10], discipline_mixes.items(), team_sizes.items(),
+            person_work_ticks.items(), work_flows.items(), grid.get("seeds") or [42]):
+        runs.append({
+            "run_id": len(runs),
+            "num_teams": num_teams,
+            "discipline_mix": mix,
+            "disciplines": disciplines,
+            "team_size": size,
+            "people_per_team": people_per_team,
+            "work_ticks": ticks,
+            "person_work_ticks": work_ticks,
+            "work_flow": flow,
+            "chain": chain,
+            "seed": seed,
+            "num_work_units": grid.get("num_work_units", 200),
+            "max_ticks": grid.get("max_ticks", 20000),
+        })
+    return runs
+
+def run_scenario(run):
+    """Builds the config for one run, simulates it and returns its row of the results table."""
+    config = build_config(run["num_teams"], run["num_work_units"], run["disciplines"], tuple(run["people_per_team"]),
+                          run["person_work_ticks"], work_flow_from_chain(run["chain"]), seed=run["seed"])
+    simulation = OrgSimulation(config, seed=run["seed"])
+    status = simulation.run(run["max_ticks"])
+    metrics = simulation.get_metrics()
+
+    # All work units exist from tick 0, so a unit's lead time is the tick it was done;
+    # its cycle time counts from the tick someone first started on it
+    done = simulation.done_tick >= 0
+    lead_times = simulation.done_tick[done]
+    cycle_times = lead_times - simulation.start_tick[done]
+    ticks = simulation.tick_count
+    row = {column: run[column] for column in ["run_id", "num_teams", "discipline_mix", "team_size", "work_ticks", "work_flow", "seed"]}
+    row.update({
+        "people": len(simulation.person_ids),
+        "work_units": len(simulation.unit_ids),
+        "status": status,
+        "ticks": ticks,
+        "done": int(done.sum()),
+        "throughput": done.sum() / ticks if ticks else 0.0,
+        "lead_time_mean": lead_times.mean() if len(lead_times) else np.nan,
+        "lead_time_p50": np.percentile(lead_times, 50) if len(lead_times) else np.nan,
+        "lead_time_p90": np.percentile(lead_times, 90) if len(lead_times) else np.nan,
+        "cycle_time_mean": cycle_times.mean() if len(cycle_times) else np.nan,
+        "cycle_time_p90": np.percentile(cycle_times, 90) if len(cycle_times) else np.nan,
+        "backlog_mean": metrics["backlog"].mean() if ticks else 0.0,
+        "backlog_max": int(metrics["backlog"].max()) if ticks else 0,
+        "utilization": metrics["in_progress"].mean() / len(simulation.person_ids) if ticks and simulation.person_ids else 0.0,
+    })
+    return row
+
+def format_value(value):
+    if isinstance(value, (float, np.floating)):
+        return f"{value:.3f}"
+    return str(value)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the org simulation over a grid of team topologies, work ticks and workflows.")
+    parser.add_argument("sweep", type=str, nargs="?", default=None, help="JSON file with the grid (see the top of orgsim_sweep.py); defaults only if left out.")
+    parser.add_argument("--output", type=str, default="sweep.csv", help="CSV file with one row per run (default: sweep.csv).")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="Number of worker processes (default: one per CPU).")
+    args = parser.parse_args()
+
+    try:
+        runs = load_sweep(args.sweep)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Running {len(runs)} simulations in {args.processes} processes")
+    rows = []
+    errors = []
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.processes) as executor:
+        futures = {executor.submit(run_scenario, run): run["run_id"] for run in runs}
+        for future in as_completed(futures):
+            try:
+                rows.append(future.result())
+            except Exception as e:
+                errors.append(f"Run {futures[future]} failed: {e}")
+    rows.sort(key=lambda row: row["run_id"])
+
+    for error in errors:
+        print(error)
+    with open(args.output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows({column: format_value(value) for column, value in row.items()} for row in rows)
+    print(f"{len(rows)} of {len(runs)} simulations done in {time.perf_counter() - start_time:.1f}s, results written to '{args.output}'")
+
+    summary = ["run_id", "num_teams", "discipline_mix", "team_size", "work_ticks", "work_flow", "seed", "status", "ticks", "throughput", "lead_time_p50", "lead_time_p90", "utilization"]
+    widths = [max(len(column), *(len(format_value(row[column])) for row in rows)) for column in summary] if rows else []
+    print("  ".join(column.ljust(width) for column, width in zip(summary, widths)))
+    for row in rows:
+        print("  ".join(format_value(row[column]).ljust(width) for column, width in zip(summary, widths)))
+
+if __name__ == "__main__":
+    main()
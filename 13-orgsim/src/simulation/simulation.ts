@@ -6,7 +6,8 @@ import {
   type Team,
   type Person,
   type WorkUnit,
-  type PersonConfigItem
+  type PersonConfigItem,
+  type WorkUnitConfigItem
 } from './types';
 
 const MAX_BACKLOG_SIZE = 1;
@@ -106,7 +107,17 @@ class OrgSimulation implements SimulationAPI {
       }
     });
 
-    this.state.workUnits = config.initialWorkUnits.map((wuConfig, index) => {
+    // Range-encoded entries stand for `count` work units of one type
+    const initialWorkUnits: WorkUnitConfigItem[] = config.initialWorkUnits.flatMap(wuConfig =>
+      'count' in wuConfig
+        ? Array.from({ length: wuConfig.count }, (_, i) => ({
+            id: `${wuConfig.idPrefix ?? 'Work-'}${(wuConfig.firstId ?? 1) + i}`,
+            type: wuConfig.type,
+          }))
+        : [wuConfig]
+    );
+
+    this.state.workUnits = initialWorkUnits.map((wuConfig, index) => {
       const workUnit: WorkUnit = {
         id: wuConfig.id || `wu_${Date.now()}_${index}`,
         type: wuConfig.type,
@@ -25,10 +25,20 @@ export interface WorkUnit {
 
 export type PersonConfigItem = Omit<Person, 'workRemainingTicks' | 'teamId'> & { initialTeamName: string };
 
+export type WorkUnitConfigItem = Omit<WorkUnit, 'currentOwnerId' | 'currentTeamOwnerId'>;
+
+// `count` work units of one type with ids idPrefix + firstId, idPrefix + (firstId + 1), ...
+export interface WorkUnitRangeConfigItem {
+  type: string;
+  count: number;
+  idPrefix?: string; // Default: "Work-"
+  firstId?: number; // Default: 1
+}
+
 export interface SimulationConfig {
   teams: Omit<Team, 'members'>[]; // Initial team structure without people
   people: PersonConfigItem[];
-  initialWorkUnits: Omit<WorkUnit, 'currentOwnerId' | 'currentTeamOwnerId'>[];
+  initialWorkUnits: (WorkUnitConfigItem | WorkUnitRangeConfigItem)[];
   personWorkTicks: {
     [key in string]: {
       [key in string]: number; // Ticks per work unit type for a discipline